@@ -8,9 +8,10 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
-import os, sys, time, threading, configparser, webbrowser
+from tkinter import simpledialog
+import os, sys, shutil, threading, configparser
 
-import widgets, interpreter
+import widgets, interpreter, profiler, debugger, cache, scheduler, snapshot
 from constants import *
 
 
@@ -19,12 +20,9 @@ class Application(ttk.Frame):
         self.window = window
         tk.Frame.__init__(self, window)
         
-        icon = tk.PhotoImage(file="icon.png")
-        # I didn't want to hack around by cross platforming,
-        # in ico, icns, xbm formats, so I just use png
-        self.window.iconphoto(False, icon)
-    
-        self.brainfuck_image = tk.PhotoImage(file="brainfuck.png")
+        # The images are loaded when they're needed, after the window is shown
+        self.icon = None
+        self.brainfuck_image = None
 
         self.config = configparser.ConfigParser()
         try:
@@ -32,8 +30,36 @@ class Application(ttk.Frame):
             self.dark_mode = tk.IntVar(value=int(self.config["settings"]["dark_mode"]))
             self.use_azure = tk.BooleanVar(value=bool(int(self.config["settings"]["use_azure"])))
             self.current_file = self.config["files"]["current"]
+            self.backend = self.config["settings"].get("backend", "interpreter")
+            self.cell_bits = int(self.config["settings"].get("cell_bits", "8"))
+            self.grow_left = bool(int(self.config["settings"].get("grow_left", "0")))
+            self.scrollback = int(self.config["settings"].get("scrollback", "100000"))
+            eof = self.config["settings"].get("eof", "0")
+            self.eof = None if eof == "unchanged" else int(eof)
+            self.run_mode = self.config["settings"].get("run_mode", "thread")
+            self.timeout = float(self.config["settings"].get("timeout", "0")) or None
+            self.max_steps = int(self.config["settings"].get("max_steps", "0")) or None
+            self.max_cells = int(self.config["settings"].get("max_cells", "0")) or None
+            self.cache_dir = self.config["settings"].get("cache_dir", "") or None
+            self.checkpoint_interval = float(self.config["settings"].get("checkpoint_interval", "0"))
         except:
             raise RuntimeError("Problem with configuration file")
+        
+        self.process = None
+        self.machine = None # The Interpreter (or profiler Control) of the run in the thread
+        self.worker = None
+        self.slicer = None
+        self.checkpoint = None
+        self.counters = None
+        self.busy = False
+        self.program_cache = cache.ProgramCache(directory=self.cache_dir)
+        self.profile_result = None
+        self.output_search = None
+        self.file_stat = None # The mtime and size of the file when it was loaded or saved
+        self.saver = None
+        self.debugger = None
+        self.debugger_busy = False
+        self.tape_window = None
 
         if not os.path.exists("Azure-ttk-theme-main"):
             self.use_azure.set(False)
@@ -46,6 +72,7 @@ class Application(ttk.Frame):
         self.file_menu.add_command(label="Open", command=self.open_file, accelerator=open_accel)
         self.file_menu.add_command(label="Save", command=self.save_file, accelerator=save_accel)
         self.file_menu.add_command(label="Save as", command=self.save_as_file, accelerator=saveas_accel)
+        self.file_menu.add_command(label="Export profile", command=self.export_profile, state="disabled")
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Exit", command=self.exit, accelerator=quit_accel)
 
@@ -53,12 +80,31 @@ class Application(ttk.Frame):
         self.help_menu.add_command(label="About", command=self.about)
         self.help_menu.add_command(label="What is Brainfuck?", command=self.open_wiki)
 
+        self.debug_menu = tk.Menu(self.menubar, tearoff=False, bd=0)
+        self.debug_menu.add_command(label="Start debugging", command=self.start_debugging, accelerator="F6")
+        self.debug_menu.add_command(label="Continue", command=self.debug_continue, accelerator="F8")
+        self.debug_menu.add_command(label="Step", command=self.debug_step, accelerator="F10")
+        self.debug_menu.add_command(label="Step over loop", command=self.debug_step_over, accelerator="F11")
+        self.debug_menu.add_command(label="Run to cursor", command=self.debug_run_to_cursor)
+        self.debug_menu.add_command(label="Stop debugging", command=self.stop_debugging)
+
+        self.hex_view = tk.BooleanVar(value=False)
+        self.output_menu = tk.Menu(self.menubar, tearoff=False, bd=0)
+        self.output_menu.add_command(label="Find", command=self.find_output, accelerator="F3")
+        self.output_menu.add_command(label="Find previous", command=self.find_previous_output, accelerator="Shift+F3")
+        self.output_menu.add_checkbutton(label="Hex view", variable=self.hex_view, command=lambda: self.output_box.set_hex(self.hex_view.get()))
+        self.output_menu.add_command(label="Save output", command=self.save_output)
+        self.output_menu.add_command(label="Clear output", command=lambda: self.output_box.delete("0.0", "end"))
+
         self.menubar.add_cascade(menu=self.file_menu, label="File")
         self.menubar.add_command(label="Settings", command=self.settings)
+        self.menubar.add_cascade(menu=self.output_menu, label="Output")
         self.menubar.add_cascade(menu=self.help_menu, label="Help")
         self.menubar.add_command(label="    ", state="disabled")
         self.menubar.add_command(label="Run", command=self.run)
         self.menubar.add_command(label="Stop", command=self.stop)
+        self.menubar.add_command(label="Profile", command=self.profile)
+        self.menubar.add_cascade(menu=self.debug_menu, label="Debug")
         
         self.window.config(menu=self.menubar)
 
@@ -74,20 +120,27 @@ class Application(ttk.Frame):
         self.input_box = widgets.Input(self.io_paned)
         self.io_paned.add(self.input_box, weight=1)
 
-        self.output_box = widgets.Output(self.io_paned)
+        self.output_box = widgets.Output(self.io_paned, scrollback=self.scrollback)
         self.io_paned.add(self.output_box, weight=1)
 
         self.main_paned.pack(expand=True, fill="both")
 
 
         self.change_appearance()
-        self.show_file()
-        self.save_file()
+        # The window is shown first, the file is loaded (and highlighted) when Tk is idle
+        self.window.after_idle(self.load_icon)
+        self.window.after_idle(self.show_file)
 
 
-        # self.window.bind("<FocusIn>", self.ask_reload)
-        self.window.bind("<<Compare>>", self.compare)
+        self.window.bind("<FocusIn>", self.ask_reload)
+        self.editor_box.bind("<<DirtyChanged>>", self.update_title)
         self.window.bind_all("<F5>", self.run)
+        self.window.bind_all("<F6>", self.start_debugging)
+        self.window.bind_all("<F8>", self.debug_continue)
+        self.window.bind_all("<F10>", self.debug_step)
+        self.window.bind_all("<F11>", self.debug_step_over)
+        self.window.bind_all("<F3>", self.find_output)
+        self.window.bind_all("<Shift-F3>", self.find_previous_output)
         self.window.bind_all(settings_keys, self.settings)
         self.window.bind_all(new_keys, self.new_file)
         self.window.bind_all(open_keys, self.open_file)
@@ -96,17 +149,36 @@ class Application(ttk.Frame):
         self.window.protocol("WM_DELETE_WINDOW", self.exit)
 
 
+    def load_icon(self):
+        # I didn't want to hack around by cross platforming,
+        # in ico, icns, xbm formats, so I just use png
+        self.icon = tk.PhotoImage(file="icon.png")
+        self.window.iconphoto(False, self.icon)
+
+
     def check_internet(self):
         import socket
         HOST = "8.8.8.8"
         PORT = 53
         TIMEOUT = 2
         try:
-            socket.setdefaulttimeout(TIMEOUT)
-            socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((HOST, PORT))
+            socket.create_connection((HOST, PORT), TIMEOUT).close()
             return True
-        except socket.error:
+        except OSError:
             return False
+
+
+    def check_internet_async(self, callback):
+        """Probe the connection in a thread, and call back with the result on the Tk thread, so the window doesn't freeze"""
+        result = []
+        threading.Thread(target=lambda: result.append(self.check_internet()), daemon=True).start()
+        
+        def poll():
+            if result:
+                callback(result[0])
+            else:
+                self.window.after(100, poll)
+        poll()
     
     def threaded(func):
         def wrapper(*args, **kwargs):
@@ -121,8 +193,9 @@ class Application(ttk.Frame):
         new_file = filedialog.asksaveasfilename(title='Create...', filetypes=[('Brainfuck files', '*.bf *.b'), ('All files', '*.*')])
         if new_file:
             self.current_file = new_file
+            self.editor_box.cancel_load()
             self.editor_box.delete("0.0", "end")
-            self.save_file()
+            self.save_file(wait=True)
             self.show_file()
 
 
@@ -134,36 +207,75 @@ class Application(ttk.Frame):
             self.show_file()
         
 
-    def save_file(self, *args):
-        if self.current_file:
-            with open(self.current_file, "w") as file:
-                file.write(self.editor_box.get("0.0", "end"))
-        else:
+    def save_file(self, *args, wait=False):
+        """
+        Write the file in the background, unless it's unchanged. With wait,
+        it returns when the file is written, for the ones which read it
+        """
+        if not self.current_file:
             self.save_as_file()
-        self.editor_box.dirty = False
-        self.window.title("Brainfuck IDE - {}".format(self.current_file))
+            return
+        if self.editor_box.loading:
+            return
+        if self.editor_box.check_dirty() or self.file_stat is None or self.stat_file() != self.file_stat:
+            if self.saver is not None:
+                self.saver.join() # The saves are written in order
+            self.saver = self.write_file(self.current_file, self.editor_box.get("1.0", "end"))
+            self.editor_box.mark_saved()
+            self.update_title()
+        if wait and self.saver is not None:
+            self.saver.join()
+
+
+    @threaded
+    def write_file(self, path, content):
+        # Written into a temporary file first, so a crash never leaves half of the file
+        temp = path + ".tmp"
+        try:
+            with open(temp, "w") as file:
+                file.write(content)
+            if os.path.exists(path):
+                shutil.copymode(path, temp) # Like the executable bit
+            os.replace(temp, path)
+            self.file_stat = self.stat_file()
+        except OSError as error:
+            self.editor_box.mark_unsaved()
+            print("Couldn't save {}: {}".format(path, error))
 
 
     def save_as_file(self, *args):
         new_file = filedialog.asksaveasfilename(title='Save as...', filetypes=[('Brainfuck files', '*.bf *.b'), ('All files', '*.*')])
         if new_file:
             self.current_file = new_file
+            self.file_stat = None
             self.save_file()
-            self.show_file()
 
 
     def show_file(self):
+        self.editor_box.cancel_load()
         self.editor_box.delete("0.0", "end")
-        try:
-            with open(self.current_file, "r") as program:
-                content = program.read()
-                content = content.rstrip("\n") # Removes the unnecessary newline character
-                if content:
-                    self.editor_box.insert("1.0", content)
+        self.update_title()
+        if os.path.exists(self.current_file):
             self.output_box.delete("0.0", "end")
-            self.window.title("Brainfuck IDE - {}".format(self.current_file))
-        except FileNotFoundError:
-            pass
+            self.editor_box.load(self.current_file, self.file_loaded)
+
+
+    def file_loaded(self):
+        self.file_stat = self.stat_file()
+        self.editor_box.mark_saved()
+        self.update_title()
+
+
+    def update_title(self, *args):
+        self.window.title("Brainfuck IDE - {}{}".format(self.current_file, " *" if self.editor_box.dirty else ""))
+
+
+    def stat_file(self):
+        try:
+            stat = os.stat(self.current_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
 
     def change_appearance(self):
@@ -178,6 +290,14 @@ class Application(ttk.Frame):
         self.editor_box.text.tag_configure("Token.Name.Tag", foreground=Appearance.io)
         self.editor_box.text.tag_configure("Token.Name.Variable", foreground=Appearance.variable)
         self.editor_box.text.tag_configure("Token.Comment", foreground=Appearance.comment)
+        self.editor_box.text.tag_configure("debug", background=Appearance.debug)
+        self.output_box.text.tag_configure("found", background=Appearance.debug)
+        self.editor_box.breakpoint_color = Appearance.variable
+        self.editor_box.warning_color = Appearance.warning
+        self.editor_box.tooltip.config(bg=Appearance.bg, fg=Appearance.warning)
+        self.editor_box.gutter.config(bg=Appearance.bg)
+        for level, color in enumerate(Appearance.heat):
+            self.editor_box.text.tag_configure("heat{}".format(level), background=color)
         
         self.editor_box.highlight()
         
@@ -196,45 +316,357 @@ class Application(ttk.Frame):
             
 
     def open_wiki(self):
+        import webbrowser
         webbrowser.open("https://en.wikipedia.org/wiki/Brainfuck")
         
 
-    def compare(self, *args):
+    def ask_reload(self, *args):
+        # Only the time and the size of the file are checked, it's read only if they changed
+        if self.file_stat is None or self.editor_box.loading:
+            return
+        stat = self.stat_file()
+        if stat is None or stat == self.file_stat:
+            return
+        self.file_stat = stat
         with open(self.current_file) as file:
-            if file.read() != self.editor_box.get("0.0", "end"):
-                self.editor_box.dirty = True
-                self.window.title("Brainfuck IDE - {} *".format(self.current_file))
-
-
-    # def ask_reload(self, args):
-    #     with open(self.current_file) as file:
-    #         content = file.read()
-    #         print(content)
-    #         print(self.editor_box.get("0.0", "end"))
-    #         if content != self.editor_box.get("0.0", "end"):
-    #             msg = messagebox.askyesno("External modification", "Looks like\n'{}' was modified outside the editor.\n\nDo you want to discard the current editor content and reload the file from disk?".format(self.current_file))
-    #             if msg:
-    #                 self.editor_box.delete("0.0", "end")
-    #                 self.editor_box.insert("0.0", content)
-    #             else:
-    #                 self.editor_box.dirty = True
-    #                 self.window.title("Brainfuck IDE - {} *".format(self.current_file))
+            content = file.read().rstrip("\n")
+        disk_hash = self.editor_box.content_hash(content + "\n")
+        if disk_hash == self.editor_box.saved_hash:
+            return
+        msg = messagebox.askyesno("External modification", "Looks like\n'{}' was modified outside the editor.\n\nDo you want to discard the current editor content and reload the file from disk?".format(self.current_file))
+        # Either way, the editor is compared with the file from now on
+        if msg:
+            self.editor_box.delete("1.0", "end")
+            self.editor_box.insert("1.0", content)
+            self.editor_box.mark_saved()
+        else:
+            self.editor_box.mark_saved(disk_hash, len(content) + 1)
+        self.update_title()
 
 
     @threaded
     def exec(self):
-        interpreter.execute(self.current_file)
+        # The jit can't run in slices, so it gets a thread
+        try:
+            program = self.program_cache.get_file(self.current_file)
+            self.window.after(0, self.editor_box.show_warnings, program.warnings)
+            self.machine = interpreter.Interpreter(program, interpreter.text_input(sys.stdin), interpreter.text_output(sys.stdout),
+                                                   self.cell_bits, self.grow_left, self.eof, self.max_steps, self.max_cells,
+                                                   self.backend)
+            self.machine.run()
+        except interpreter.BrainfuckError as error:
+            print(error)
+        finally:
+            self.busy = False
+
+
+    def exec_slices(self):
+        """
+        Compile the program in a thread, then run it in short slices between
+        the events of Tk, so the UI stays responsive without a thread
+        """
+        control = self.machine = interpreter.Control() # Stop cancels the run while it's compiled
+        self.busy = True
+        result = []
+        
+        def compile():
+            try:
+                # The first run also evaluates the start of the program which doesn't read input, the others skip it
+                result.append(self.program_cache.get_file(self.current_file, prefix=(self.cell_bits, self.grow_left)))
+            except (interpreter.BrainfuckError, OSError) as error:
+                result.append(error)
+                
+        self.worker = threading.Thread(target=compile, daemon=True)
+        self.worker.start()
+        self.start_slices(control, result)
+
+
+    def start_slices(self, control, result):
+        if not result:
+            self.window.after(20, self.start_slices, control, result)
+            return
+        self.worker = None
+        program = result[0]
+        if control.stop or isinstance(program, Exception):
+            if not control.stop:
+                print(program)
+            self.busy = False
+            return
+        self.editor_box.show_warnings(program.warnings)
+        input = snapshot.CountedInput(interpreter.polled_input(sys.stdin))
+        output = snapshot.CountedOutput(interpreter.text_output(sys.stdout))
+        self.counters = (input, output)
+        self.machine = self.load_snapshot(program, input, output)
+        if self.machine is None:
+            self.machine = interpreter.Interpreter(program, input, output, self.cell_bits, self.grow_left, self.eof,
+                                                   self.max_steps, self.max_cells)
+        self.checkpoint = snapshot.Checkpointer(self.snapshot_path(), self.checkpoint_interval or float("inf"))
+        self.slicer = scheduler.Slicer(0.02)
+        self.run_slice(self.machine)
+
+
+    def snapshot_path(self):
+        return self.current_file + ".snapshot"
+
+
+    def load_snapshot(self, program, input, output):
+        """Offer to continue the saved run of the program, if there is one"""
+        path = self.snapshot_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            state = snapshot.Snapshot.load(path)
+            machine = state.restore(program, input, output)
+        except (ValueError, OSError) as error: # The program was changed since, or it's not a snapshot
+            print("Couldn't continue the saved run: {}".format(error))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if not messagebox.askyesno("Saved run", "There is a saved run of this program.\nDo you want to continue it?"):
+            os.remove(path)
+            return None
+        input.count, output.count = state.input_offset, state.output_offset
+        self.input_box.feed(state.pending.decode())
+        return machine
+
+
+    def save_snapshot(self, machine, force=False):
+        input, output = self.counters
+        self.checkpoint(machine, input.count, output.count, self.input_box.pending().encode(), force)
+
+
+    def run_slice(self, machine):
+        waiting = machine.waiting
+        try:
+            finished = self.slicer.run(machine)
+        except interpreter.BrainfuckError as error:
+            print(error)
+            finished = True
+        except Exception as error:
+            # Any other error ends the run too, it mustn't leave the IDE busy
+            print("Internal error: {}".format(error))
+            finished = True
+        if finished or machine.cancelled:
+            if machine is self.machine:
+                self.busy = False
+            if finished and os.path.exists(self.snapshot_path()):
+                os.remove(self.snapshot_path())
+        else:
+            if self.checkpoint_interval:
+                self.save_snapshot(machine)
+            if machine.waiting and not waiting:
+                self.input_box.text.focus() # Once, when the program starts to wait for input
+            # Waiting for input doesn't need to poll as fast as a running program
+            self.window.after(50 if machine.waiting else 1, self.run_slice, machine)
+
+
+    def exec_process(self):
+        import process
+        
+        self.process = process.ChildProcess(self.current_file, self.process_output, self.process_exit,
+                                            self.timeout, self.max_steps, self.max_cells,
+                                            self.backend, self.cell_bits, self.grow_left, self.eof, self.cache_dir)
+        self.pump_input(self.process)
+
+
+    @threaded
+    def pump_input(self, child):
+        while child.running:
+            text = self.input_box.read(4096)
+            if text:
+                child.write(text.encode())
+            else:
+                if self.input_box.eof:
+                    child.close_input()
+                break
+
+
+    def process_output(self, data):
+        self.output_box.write(data.decode("latin-1"))
+
+
+    def process_exit(self, error):
+        if error:
+            self.output_box.write("\n{}\n".format(error))
+        self.input_box.cancel()
+
+
+    @threaded
+    def exec_profile(self):
+        try:
+            result = profiler.profile_file(self.current_file, self.cell_bits, self.grow_left, self.eof, self.machine)
+        finally:
+            self.busy = False
+        if result is not None:
+            self.window.after(0, self.show_profile, result)
+
+
+    def profile(self, *args):
+        if not self.running():
+            self.save_file(wait=True)
+            sys.stdin.clear()
+            self.editor_box.clear_heatmap()
+            self.busy = True
+            self.machine = interpreter.Control()
+            self.worker = self.exec_profile()
+
+
+    def show_profile(self, result):
+        self.profile_result = result
+        self.editor_box.show_heatmap(result.heat())
+        self.file_menu.entryconfigure("Export profile", state="normal")
+
+
+    def export_profile(self, *args):
+        path = filedialog.asksaveasfilename(title='Export profile...', defaultextension=".json", filetypes=[('JSON files', '*.json'), ('Text reports', '*.txt')])
+        if path and path.endswith(".txt"):
+            with open(path, "w") as file:
+                file.write(self.profile_result.report())
+        elif path:
+            self.profile_result.save(path)
+
+
+    def find_output(self, *args, backwards=False):
+        # F3 asks for the text once, then it finds the next match
+        if not args or not self.output_search:
+            pattern = simpledialog.askstring("Find", "Find in the output:", initialvalue=self.output_search or "")
+            if not pattern:
+                return
+            self.output_search = pattern
+        if not self.output_box.search(self.output_search, backwards):
+            messagebox.showinfo("Find", "'{}' wasn't found".format(self.output_search))
+
+
+    def find_previous_output(self, *args):
+        self.find_output(*args, backwards=True)
+
+
+    def save_output(self, *args):
+        path = filedialog.asksaveasfilename(title='Save output...', defaultextension=".txt", filetypes=[('Text files', '*.txt'), ('All files', '*.*')])
+        if path:
+            self.output_box.save(path)
+
+
+    def start_debugging(self, *args):
+        if self.running():
+            return
+        self.stop_debugging()
+        self.save_file()
+        sys.stdin.clear()
+        self.output_box.delete("0.0", "end")
+        try:
+            self.debugger = debugger.Debugger(self.editor_box.get("1.0", "end-1c"), interpreter.text_input(sys.stdin), interpreter.text_output(sys.stdout),
+                                              self.cell_bits, self.grow_left, self.eof)
+        except interpreter.BrainfuckError as error:
+            print(error)
+            return
+        
+        self.tape_window = tk.Toplevel(self.window)
+        self.tape_window.transient(self.window)
+        self.tape_window.title("Tape")
+        self.tape_window.geometry("600x90")
+        self.tape_window.protocol("WM_DELETE_WINDOW", self.stop_debugging)
+        self.tape_view = widgets.TapeView(self.tape_window)
+        self.tape_view.pack(expand=True, fill="both")
+        self.tape_view.canvas.config(bg=Appearance.bg)
+        self.tape_view.fg = Appearance.fg
+        self.tape_view.highlight = Appearance.debug
+        self.tape_window.update_idletasks()
+        self.show_debug_state()
+
+
+    @threaded
+    def debug_command(self, command, *args):
+        session = self.debugger # Stop debugging can clear it while this runs
+        session.set_breakpoints(self.editor_box.breakpoint_positions())
+        try:
+            command(*args)
+        except interpreter.BrainfuckError as error:
+            print(error)
+            session.position = len(session.ops)
+        finally:
+            self.debugger_busy = False
+            self.window.after(0, self.show_debug_state)
+
+
+    def run_debug_command(self, command, *args):
+        if self.debugger is not None and not self.debugger_busy:
+            self.debugger_busy = True
+            self.debug_command(command, *args)
+
+
+    def debug_continue(self, *args):
+        self.run_debug_command(self.debugger and self.debugger.continue_)
+
+
+    def debug_step(self, *args):
+        self.run_debug_command(self.debugger and self.debugger.step)
+
+
+    def debug_step_over(self, *args):
+        self.run_debug_command(self.debugger and self.debugger.step_over)
+
+
+    def debug_run_to_cursor(self, *args):
+        cursor = len(self.editor_box.get("1.0", "insert"))
+        self.run_debug_command(self.debugger and self.debugger.run_to, cursor)
+
+
+    def show_debug_state(self):
+        if self.debugger is None:
+            return
+        self.tape_view.show(self.debugger.tape, self.debugger.pointer)
+        if self.debugger.finished:
+            self.editor_box.show_position()
+            self.tape_window.title("Tape - finished")
+        else:
+            start = self.debugger.source_position
+            end = start + 1
+            if self.debugger.position + 1 < len(self.debugger.positions):
+                end = self.debugger.positions[self.debugger.position + 1]
+            self.editor_box.show_position(start, end)
+            self.tape_window.title("Tape - pointer at cell {}".format(self.debugger.pointer - self.debugger.tape.origin))
+
+
+    def stop_debugging(self, *args):
+        if self.debugger is not None:
+            self.debugger.pause()
+            self.input_box.cancel()
+            self.debugger = None
+        if self.tape_window is not None:
+            self.tape_window.destroy()
+            self.tape_window = None
+        self.editor_box.show_position()
+
+
+    def running(self):
+        return self.busy or (self.process is not None and self.process.running) or self.debugger_busy
 
 
     def run(self, *args):
-        if not interpreter.running:
-            self.save_file()
+        if not self.running():
+            self.save_file(wait=True)
             sys.stdin.clear()
-            self.exec()
+            if self.run_mode == "process":
+                self.exec_process()
+            elif self.backend == "jit":
+                self.busy = True
+                self.machine = None
+                self.worker = self.exec()
+            else:
+                self.exec_slices()
 
 
     def stop(self):
-        interpreter.stop = True
+        if self.process is not None:
+            self.process.kill()
+        if self.machine is not None:
+            self.machine.cancel()
+            if self.worker is None or not self.worker.is_alive():
+                self.busy = False # A program running in slices stops at its next slice
+        self.input_box.cancel()
         
         
     def settings(self, *args):
@@ -294,7 +726,13 @@ class Application(ttk.Frame):
             azure_progress.update()
 
 
-        if not os.path.exists("Azure-ttk-theme-main") and self.check_internet():
+        azure_frame = azure_button = None
+        
+        def show_download(online):
+            nonlocal azure_frame, azure_button
+            
+            if not online or not settings_window.winfo_exists():
+                return
             azure_frame = ttk.LabelFrame(settings_window, text="Azure theme")
             azure_frame.grid(row=3, column=0, padx=10, pady=10, sticky="nswe")
             
@@ -306,6 +744,11 @@ class Application(ttk.Frame):
             
             azure_link = widgets.LinkLabel(azure_frame, text="Visit it on GitHub", url="https://github.com/rdbende/Azure-ttk-theme")
             azure_link.grid(row=1, column=1, padx=10, pady=(5, 10))
+
+
+        if not os.path.exists("Azure-ttk-theme-main"):
+            # The download is offered when the probe finds a connection
+            self.check_internet_async(show_download)
             
         elif os.path.exists("Azure-ttk-theme-main"):
             azure_switch = ttk.Checkbutton(theme_frame, text="Azure theme", variable=self.use_azure, command=self.change_appearance)
@@ -325,6 +768,8 @@ class Application(ttk.Frame):
         about_frame = tk.Frame(about_window)
         about_frame.pack(expand=True, fill="both", padx=20, pady=20)
         
+        if self.brainfuck_image is None:
+            self.brainfuck_image = tk.PhotoImage(file="brainfuck.png")
         image_label = tk.Label(about_frame, image=self.brainfuck_image, compound="center")
         image_label.grid(row=0, column=0, pady=5)
         
@@ -339,24 +784,30 @@ class Application(ttk.Frame):
         
         
     def exit(self):
-        if interpreter.running:
+        if self.running():
             msg = messagebox.askyesno("Program is running!", "Your program is still running!\nDo you want to kill it?")
             if msg:
+                machine = self.machine
+                if isinstance(machine, interpreter.Interpreter) and machine.backend == "interpreter" and not machine.finished:
+                    if messagebox.askyesno("Save state", "Do you want to save the state of the program, to continue it next time?"):
+                        self.save_snapshot(machine, force=True)
                 self.stop()
-                time.sleep(0.001) # The sleep is needed, because the thread does not stop immediately
+                if self.process is not None:
+                    self.process.wait()
+                if self.worker is not None:
+                    self.worker.join(1)
                 self.exit()
                 
-        if self.editor_box.dirty:
+        if self.editor_box.check_dirty():
             msg = messagebox.askyesnocancel("File not saved", "Do you want to save your file?")
             if msg:
-                self.editor_box.dirty = False
                 self.save_file()
                 self.exit()
             elif msg is False:
-                self.editor_box.dirty = False
+                self.editor_box.mark_saved() # Discarded
                 self.exit()
                 
-        if not interpreter.running and not self.editor_box.dirty: 
+        if not self.running() and not self.editor_box.dirty: 
             with open('settings.ini', 'w') as file:
                 self.config["settings"]["dark_mode"] = str(self.dark_mode.get())
                 self.config["settings"]["use_azure"] = str(int(self.use_azure.get()))
@@ -0,0 +1,235 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+from array import array
+
+from interpreter import ADD, MOVE, SET_ZERO, INPUT, OPEN, CLOSE, MULTIPLY, SCAN, Program
+
+# The ops after which the current cell is surely zero
+_ZEROING = (CLOSE, SET_ZERO, MULTIPLY, SCAN)
+
+
+class Analysis:
+    """
+    The results of analyze. dead is the set of op indexes which never run
+    (a dead loop is all of its ops), warnings is a sorted list of
+    (source position, message), and cells is the number of cells the
+    program surely fits in, or None if it can't be known
+    """
+    def __init__(self, dead, warnings, cells):
+        self.dead = dead
+        self.warnings = warnings
+        self.cells = cells
+
+
+class _Loop:
+    """
+    The effect of one iteration of a loop, relative to the pointer at the
+    [. If the pointer doesn't get back to the same cell, it's unbalanced,
+    and nothing else is known
+    """
+    def __init__(self, balanced, writes=frozenset(), lowest=0, highest=0):
+        self.balanced = balanced
+        self.writes = writes
+        self.lowest = lowest
+        self.highest = highest
+        self.offset = 0 # Where the pointer is, while the loop is being summed up
+
+    def visit(self, lowest, highest):
+        self.lowest = min(self.lowest, lowest)
+        self.highest = max(self.highest, highest)
+
+
+class _State:
+    """
+    The known cell values of the straight code, like constant propagation.
+    The values aren't wrapped, so they're right for every cell width. The
+    pointer is relative to the first cell while anchored; after a loop
+    which moves it by an unknown amount, the cells are tracked relative
+    to where it stopped
+    """
+    def __init__(self):
+        self.pointer = 0
+        self.cells = {}
+        self.default = 0 # The value of the cells not in the dict, None if unknown
+        self.anchored = True
+        self.lowest = 0
+        self.highest = 0
+
+    def get(self, offset=0):
+        return self.cells.get(self.pointer + offset, self.default)
+
+    def set(self, value, offset=0):
+        self.cells[self.pointer + offset] = value
+
+    def visit(self, lowest, highest):
+        self.lowest = min(self.lowest, self.pointer + lowest)
+        self.highest = max(self.highest, self.pointer + highest)
+
+    def lose_pointer(self):
+        """The pointer stopped on an unknown zero cell"""
+        self.pointer = 0
+        self.cells = {0: 0}
+        self.default = None
+        self.anchored = False
+
+
+def _nonzero(value):
+    # Nonzero in every cell width, as they are at least 8 bits
+    return value is not None and 0 < abs(value) < 256
+
+
+def analyze(program):
+    ops, positions = program.ops, program.positions
+    loops = {}
+    dead = set()
+    warnings = {} # Op index: message
+
+    # The effect of every loop, in one pass. A loop is done at its ], and
+    # then it's added to the loop around it, so the nesting isn't recursion
+    stack = [] # The _Loops being summed up, with the offset of the pointer in them
+    for position, (command, argument) in enumerate(ops):
+        if command == OPEN:
+            loops[position] = _Loop(True, set())
+            stack.append(loops[position])
+            continue
+        if not stack:
+            continue
+        summary = stack[-1]
+        if command == CLOSE:
+            stack.pop()
+            summary.balanced = summary.balanced and summary.offset == 0
+            summary.writes = frozenset(summary.writes)
+            if stack and stack[-1].balanced:
+                outer = stack[-1]
+                if summary.balanced:
+                    outer.writes.update(outer.offset + offset for offset in summary.writes)
+                    outer.visit(outer.offset + summary.lowest, outer.offset + summary.highest)
+                else:
+                    outer.balanced = False
+        elif not summary.balanced:
+            continue
+        elif command == MOVE:
+            summary.offset += argument
+            summary.visit(summary.offset, summary.offset)
+        elif command in (ADD, INPUT, SET_ZERO):
+            summary.writes.add(summary.offset)
+        elif command == MULTIPLY:
+            factors, lowest, highest = argument
+            summary.writes.update(summary.offset + offset for offset, factor in factors)
+            summary.writes.add(summary.offset)
+            summary.visit(summary.offset + lowest, summary.offset + highest)
+        elif command == SCAN:
+            summary.balanced = False
+
+    def mark_dead(position):
+        command, argument = ops[position]
+        end = argument if command == OPEN else position
+        dead.update(range(position, end + 1))
+        return end
+
+    # A loop right after another one (or after an idiom) never runs, like
+    # the comment loops. It doesn't need to know anything else
+    zero = False
+    position = 0
+    while position < len(ops):
+        command, argument = ops[position]
+        if zero and command in (OPEN, SET_ZERO, MULTIPLY, SCAN):
+            position = mark_dead(position)
+        else:
+            zero = command in _ZEROING
+        position += 1
+
+    # A loop which doesn't change its own cell, and gets back to it, never ends once it's entered
+    for position, (command, argument) in enumerate(ops):
+        if command == OPEN and position not in dead:
+            summary = loops[position]
+            if summary.balanced and 0 not in summary.writes:
+                warnings[position] = "This loop never ends, unless its cell is zero when it's reached"
+
+    # Constant propagation over the code outside of the loops
+    state = _State()
+    fits = True
+    position = 0
+    while position < len(ops):
+        if position in dead:
+            position += 1
+            continue
+        command, argument = ops[position]
+        value = state.get()
+
+        if command in (OPEN, SET_ZERO, MULTIPLY, SCAN) and value == 0:
+            position = mark_dead(position)
+
+        elif command == ADD:
+            state.set(None if value is None else value + argument)
+
+        elif command == MOVE:
+            state.pointer += argument
+            state.visit(0, 0)
+            if state.anchored and state.pointer < 0:
+                warnings[position] = "The pointer moves left of the first cell here"
+
+        elif command == INPUT:
+            state.set(None)
+
+        elif command == SET_ZERO:
+            state.set(0)
+
+        elif command == MULTIPLY:
+            factors, lowest, highest = argument
+            for offset, factor in factors:
+                target = state.get(offset)
+                state.set(None if value is None or target is None else target + value * factor, offset)
+            state.set(0)
+            state.visit(lowest, highest)
+
+        elif command == SCAN:
+            state.lose_pointer()
+            fits = False
+
+        elif command == OPEN:
+            summary = loops[position]
+            if summary.balanced:
+                if _nonzero(value) and 0 not in summary.writes:
+                    warnings[position] = "This loop never ends"
+                for offset in summary.writes:
+                    state.set(None, offset)
+                state.set(0)
+                state.visit(summary.lowest, summary.highest)
+            else:
+                state.lose_pointer()
+                fits = False
+            position = argument
+
+        position += 1
+
+    cells = state.highest + 1 if fits and state.lowest >= 0 else None
+    warnings = sorted((positions[position], message) for position, message in warnings.items() if position not in dead)
+    return Analysis(dead, warnings, cells)
+
+
+def optimize(program):
+    """
+    Remove the dead code of the program, and keep the warnings and the
+    tape size of the analysis on the returned Program
+    """
+    analysis = analyze(program)
+    if analysis.dead:
+        index = {}
+        ops, positions = [], array("q")
+        for position, op in enumerate(program.ops):
+            if position not in analysis.dead:
+                index[position] = len(ops)
+                ops.append(op)
+                positions.append(program.positions[position])
+        for position, (command, argument) in enumerate(ops):
+            if command in (OPEN, CLOSE):
+                ops[position] = (command, index[argument])
+        program = Program(ops, positions)
+    program.warnings = analysis.warnings
+    program.cells = analysis.cells
+    return program
@@ -0,0 +1,174 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+import interpreter
+import partial
+from errors import BrainfuckError
+
+# The compiled program and the options of the worker processes, set once
+# by the pool initializer instead of sending them with every input
+_program = None
+_options = None
+
+
+class Result:
+    """
+    The outcome of one input. error is None, or the message of the
+    BrainfuckError (or OSError) the run ended with
+    """
+    def __init__(self, index, name, output, seconds, error=None):
+        self.index = index
+        self.name = name
+        self.output = output
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _init(program, options):
+    global _program
+    global _options
+    _program = program
+    _options = options
+
+
+def _run(task):
+    index, name, data = task
+    start = time.perf_counter()
+    try:
+        if data is None:
+            with open(name, "rb") as file:
+                data = file.read()
+        output = interpreter.run(_program, data, **_options)
+    except (BrainfuckError, OSError) as error:
+        return Result(index, name, b"", time.perf_counter() - start, str(error))
+    return Result(index, name, output, time.perf_counter() - start)
+
+
+def run_batch(source, inputs, processes=None, backend="interpreter", cell_bits=8, grow_left=False, eof=0,
+              max_steps=None, max_cells=None):
+    """
+    Run the same program with every input on a process pool, and yield the
+    Results in the order of the inputs, as soon as they are ready. The
+    program is compiled once, here; the inputs are bytes, or (name, bytes)
+    pairs. An error in one input doesn't stop the others. The lockstep
+    backend runs them together in this process instead (see lockstep.py)
+    """
+    tasks = []
+    for index, item in enumerate(inputs):
+        name, data = item if isinstance(item, tuple) else (str(index), item)
+        tasks.append((index, name, data))
+    return _map(source, tasks, processes, backend, cell_bits, grow_left, eof, max_steps, max_cells)
+
+
+def run_files(source, paths, processes=None, backend="interpreter", cell_bits=8, grow_left=False, eof=0,
+              max_steps=None, max_cells=None):
+    """Like run_batch, but the workers read the input files themselves"""
+    tasks = [(index, path, None) for index, path in enumerate(paths)]
+    return _map(source, tasks, processes, backend, cell_bits, grow_left, eof, max_steps, max_cells)
+
+
+def _map(source, tasks, processes, backend, cell_bits, grow_left, eof, max_steps, max_cells):
+    program = source if isinstance(source, interpreter.Program) else interpreter.compile_program(source)
+    if backend != "jit" and (cell_bits, grow_left) not in program.prefixes:
+        # The start of the program which doesn't read input is run once here, not by every input
+        partial.evaluate(program, cell_bits, grow_left)
+    if backend == "lockstep":
+        yield from _lockstep(program, tasks, cell_bits, grow_left, eof, max_steps, max_cells)
+        return
+    options = dict(backend=backend, cell_bits=cell_bits, grow_left=grow_left, eof=eof,
+                   max_steps=max_steps, max_cells=max_cells)
+    processes = min(processes or os.cpu_count() or 1, max(len(tasks), 1))
+    # Small chunks keep the order of the results streaming, big ones save
+    # the round trips when there are many short inputs
+    chunksize = max(1, len(tasks) // (processes * 16))
+    with multiprocessing.Pool(processes, _init, (program, options)) as pool:
+        yield from pool.imap(_run, tasks, chunksize)
+
+
+def _lockstep(program, tasks, cell_bits, grow_left, eof, max_steps, max_cells):
+    """
+    Run the inputs in groups of lockstep.LANES in this process. The seconds
+    of a Result are the time of its whole group
+    """
+    import lockstep # NumPy is only needed for this backend
+
+    if grow_left:
+        raise ValueError("The lockstep backend can't grow the tape to the left")
+    for first in range(0, len(tasks), lockstep.LANES):
+        group = tasks[first:first + lockstep.LANES]
+        start = time.perf_counter()
+        inputs, failed = [], {}
+        for index, name, data in group:
+            if data is None:
+                try:
+                    with open(name, "rb") as file:
+                        data = file.read()
+                except OSError as error:
+                    failed[index] = str(error)
+                    data = b""
+            inputs.append(data)
+        outputs, errors = lockstep.run_lockstep(program, inputs, cell_bits, eof, max_steps, max_cells)
+        seconds = time.perf_counter() - start
+        for (index, name, data), output, error in zip(group, outputs, errors):
+            if index in failed:
+                yield Result(index, name, b"", seconds, failed[index])
+            else:
+                yield Result(index, name, output, seconds, None if error is None else str(error))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m batch", description="Run a Brainfuck program with many inputs")
+    parser.add_argument("file", help="the program to run")
+    parser.add_argument("inputs", nargs="+", help="the input files")
+    parser.add_argument("--output-dir", help="save the output of every input here, as <input name>.out")
+    parser.add_argument("--jobs", type=int, help="the number of worker processes (default: the number of CPUs)")
+    parser.add_argument("--backend", choices=("interpreter", "jit", "lockstep"), default="interpreter",
+                        help="lockstep runs the inputs together in one process, with NumPy")
+    parser.add_argument("--cell-bits", type=int, choices=(8, 16, 32), default=8)
+    parser.add_argument("--grow-left", action="store_true", help="grow the tape to the left instead of a range error")
+    parser.add_argument("--eof", choices=("0", "-1", "unchanged"), default="0", help="the value , stores at the end of the input")
+    parser.add_argument("--max-steps", type=int, help="stop an input with an error after about this many ops")
+    parser.add_argument("--max-cells", type=int, help="stop an input with an error if the tape would grow above this")
+    args = parser.parse_args(argv)
+
+    try:
+        program = interpreter.compile_file(args.file)
+    except (BrainfuckError, OSError) as error:
+        print("{}: {}".format(args.file, error), file=sys.stderr)
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    failures = 0
+    for result in run_files(program, args.inputs, args.jobs, args.backend, args.cell_bits, args.grow_left,
+                            None if args.eof == "unchanged" else int(args.eof), args.max_steps, args.max_cells):
+        if result.ok:
+            print("{}\tok\t{:.3f}s\t{} bytes".format(result.name, result.seconds, len(result.output)))
+            if args.output_dir:
+                with open(os.path.join(args.output_dir, os.path.basename(result.name) + ".out"), "wb") as file:
+                    file.write(result.output)
+        else:
+            failures += 1
+            print("{}\tfailed\t{:.3f}s\t{}".format(result.name, result.seconds, result.error))
+        sys.stdout.flush()
+
+    print("{} inputs, {} failed, {:.3f}s".format(len(args.inputs), failures, time.perf_counter() - start), file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+Benchmark from the brainfuck optimization strategies article
+It prints the alphabet backwards after a long nested countdown
+
+>++[<+++++++++++++>-]<[[>+>+<<-]>[<+>-]++++++++
+[>++++++++<-]>.[-]<<>++++++++++[>++++++++++[>++
+++++++++[>++++++++++[>++++++++++[>++++++++++[>+
++++++++++[-]<-]<-]<-]<-]<-]<-]<-]++++++++++.
@@ -0,0 +1,3 @@
+Copies the input to the output byte by byte
+
+,[.,]
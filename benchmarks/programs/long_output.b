@@ -0,0 +1,4 @@
+Prints a million characters through six nested loops of ten
+
++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++>
+++++++++++[>++++++++++[>++++++++++[>++++++++++[>++++++++++[>++++++++++[><<<<<<<.>>>>>>><-]<-]<-]<-]<-]<-]
@@ -0,0 +1,3 @@
+Twenty nested loops of two around an increment
+
+++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>++[>+<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]<-]
@@ -0,0 +1,158 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+
+Run the benchmark programs with every backend, and save the results as
+JSON, so the runs of different commits can be compared:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+
+Every run happens in a fresh process, so the peak memory is its own.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+sys.path.insert(0, ROOT)
+
+import interpreter
+import profiler
+
+BACKENDS = ("interpreter", "jit")
+
+# The programs without an .in file next to them get these inputs
+INPUTS = {
+    "cat.b": lambda: bytes(range(1, 256)) * 4096,
+}
+
+
+def load(path):
+    with open(path) as file:
+        source = file.read()
+    name = os.path.basename(path)
+    input_path = os.path.splitext(path)[0] + ".in"
+    if os.path.exists(input_path):
+        with open(input_path, "rb") as file:
+            input_bytes = file.read()
+    else:
+        input_bytes = INPUTS.get(name, lambda: b"")()
+    return name, source, input_bytes
+
+
+def count_commands(source, input_bytes):
+    """The Brainfuck commands the program executes, as if every command of the source was run one by one"""
+    return profiler.profile(source, interpreter.byte_input(io.BytesIO(input_bytes)), lambda value: None).commands
+
+
+def _measure(backend, source, input_bytes, queue):
+    start = time.perf_counter()
+    output = interpreter.run(source, input_bytes, backend=backend)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024 # Bytes on macOS, kilobytes everywhere else
+    queue.put((seconds, peak, hashlib.sha1(output).hexdigest()))
+
+
+def measure(backend, source, input_bytes):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(backend, source, input_bytes, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    old = {(result["program"], result["backend"]): result for result in baseline["results"]}
+    print("\n{:<20} {:<12} {:>10} {:>10} {:>8}".format("program", "backend", "before", "after", "speedup"))
+    for result in results:
+        before = old.get((result["program"], result["backend"]))
+        if before:
+            print("{:<20} {:<12} {:>9.3f}s {:>9.3f}s {:>7.2f}x".format(
+                result["program"], result["backend"], before["seconds"], result["seconds"], before["seconds"] / result["seconds"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Brainfuck backends")
+    parser.add_argument("programs", nargs="*", help="programs to run (default: benchmarks/programs/*.b)")
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="run only these backends")
+    parser.add_argument("--output", help="save the results into this JSON file")
+    parser.add_argument("--compare", help="compare the results with an earlier JSON file")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    # Counting the commands is slow, so it's reused for the unchanged programs
+    known_counts = {result["source_sha1"]: result["commands"] for result in (baseline or {"results": []})["results"]}
+
+    results = []
+    for path in args.programs or sorted(glob.glob(os.path.join(PROGRAMS, "*.b"))):
+        name, source, input_bytes = load(path)
+        source_sha1 = hashlib.sha1(source.encode() + input_bytes).hexdigest()
+        commands = known_counts.get(source_sha1)
+        if commands is None:
+            commands = count_commands(source, input_bytes)
+
+        for backend in args.backend or BACKENDS:
+            seconds, peak, output_sha1 = measure(backend, source, input_bytes)
+            result = {
+                "program": name,
+                "backend": backend,
+                "source_sha1": source_sha1,
+                "output_sha1": output_sha1,
+                "commands": commands,
+                "seconds": seconds,
+                "commands_per_second": commands / seconds if seconds else None,
+                "peak_rss_kb": peak,
+            }
+            results.append(result)
+            print("{:<20} {:<12} {:>9.3f}s {:>14,.0f} cmd/s {:>9,} KB".format(name, backend, seconds, result["commands_per_second"] or 0, peak))
+
+    outputs = {}
+    for result in results:
+        outputs.setdefault(result["program"], set()).add(result["output_sha1"])
+    for name, hashes in outputs.items():
+        if len(hashes) > 1:
+            print("WARNING: the backends gave different output for {}".format(name))
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+
+Measure the cold start of the IDE: every run starts a fresh Python, and
+the times are counted from starting it to the imports, to the window
+being shown, and to the file being loaded and highlighted:
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --file big.bf --output startup.json
+
+It needs a display, as the real window is created.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MILESTONES = ("imported", "created", "shown", "loaded")
+
+# Runs in the child. The IDE replaces sys.stdout with its output panel, so the result goes to the real one
+CHILD = """
+import sys, time, json
+started = float(sys.argv[1])
+times = {}
+
+import tkinter as tk
+import RUNME
+times["imported"] = time.time() - started
+
+root = tk.Tk(className="Brainfuck")
+root.geometry("800x500")
+app = RUNME.Application(root)
+if sys.argv[2]:
+    app.current_file = sys.argv[2]
+app.pack(fill="both", expand=True)
+times["created"] = time.time() - started
+
+root.wait_visibility()
+times["shown"] = time.time() - started
+
+root.update()
+while app.editor_box.loading or app.editor_box.job:
+    root.update()
+    time.sleep(0.001)
+times["loaded"] = time.time() - started
+
+root.destroy()
+sys.__stdout__.write(json.dumps(times))
+"""
+
+
+def measure(path=None):
+    result = subprocess.run([sys.executable, "-c", CHILD, repr(time.time()), path or ""],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "The IDE didn't start")
+    return json.loads(result.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the startup time of the IDE")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh starts (default: 5)")
+    parser.add_argument("--file", help="open this file instead of the one in settings.ini")
+    parser.add_argument("--output", help="save the results into this JSON file")
+    args = parser.parse_args(argv)
+
+    path = os.path.abspath(args.file) if args.file else None
+    runs = []
+    for run in range(args.runs):
+        try:
+            runs.append(measure(path))
+        except RuntimeError as error:
+            sys.exit("Couldn't start the IDE: {}".format(error))
+        print("  ".join("{} {:.3f}s".format(name, runs[-1][name]) for name in MILESTONES))
+
+    medians = {name: statistics.median(times[name] for times in runs) for name in MILESTONES}
+    print("median  " + "  ".join("{} {:.3f}s".format(name, medians[name]) for name in MILESTONES))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "file": path, "runs": runs, "median": medians},
+                      file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
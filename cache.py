@@ -0,0 +1,121 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import os
+import zlib
+import marshal
+import hashlib
+import collections
+from array import array
+
+import interpreter
+import partial
+
+MAGIC = b"BFC"
+
+
+class ProgramCache:
+    """
+    Compiled programs keyed by the hash of their source and the optimizer
+    version. The recently used ones are kept in memory, and if a directory
+    is given, every program is saved there too, so an unchanged program is
+    never parsed again, not even after a restart
+    """
+    def __init__(self, size=16, directory=None):
+        self.size = size
+        self.directory = directory
+        self.programs = collections.OrderedDict()
+
+    def key(self, digest, idioms=True):
+        return "{}-{}{}".format(digest, interpreter.OPTIMIZER_VERSION, "" if idioms else "-plain")
+
+    def get(self, source, idioms=True, prefix=None):
+        """
+        The compiled program of the source. prefix is the (cell bits, grow
+        left) options to evaluate the start of the program for, if it isn't
+        done yet (see partial.py), so the runs with these options skip it
+        """
+        digest = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+        return self._get(self.key(digest, idioms), lambda: interpreter.compile_program(source, idioms), prefix)
+
+    def get_file(self, path, idioms=True, prefix=None):
+        """Like get, but the file is hashed and compiled without reading it into memory at once"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(interpreter.CHUNK), b""):
+                digest.update(chunk)
+        return self._get(self.key(digest.hexdigest(), idioms), lambda: interpreter.compile_file(path, idioms), prefix)
+
+    def _get(self, key, compile, prefix=None):
+        program = self.programs.get(key)
+        if program is not None:
+            self.programs.move_to_end(key)
+        else:
+            program = self._load(key)
+            if program is None:
+                program = compile()
+                if prefix is None:
+                    self._save(key, program)
+
+        if prefix is not None and prefix not in program.prefixes:
+            partial.evaluate(program, *prefix)
+            self._save(key, program)
+
+        self.programs[key] = program
+        if len(self.programs) > self.size:
+            self.programs.popitem(last=False)
+        return program
+
+    def clear(self):
+        self.programs.clear()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bfc")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as file:
+                return load(file.read())
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None # Missing or broken cache files are just compiled again
+
+    def _save(self, key, program):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = self._path(key) + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(dump(program))
+            os.replace(temp, self._path(key))
+        except OSError:
+            pass
+
+
+def dump(program):
+    """
+    A compact binary form of the program: a header, and the marshalled
+    ops, positions, analysis and evaluated prefixes, compressed
+    """
+    header = MAGIC + bytes((interpreter.OPTIMIZER_VERSION, marshal.version))
+    prefixes = {options: None if prefix is None else prefix.dumps() for options, prefix in program.prefixes.items()}
+    data = (program.ops, program.positions.tobytes(), program.warnings, program.cells, prefixes)
+    return header + zlib.compress(marshal.dumps(data))
+
+
+def load(data):
+    if data[:3] != MAGIC or data[3] != interpreter.OPTIMIZER_VERSION or data[4] != marshal.version:
+        raise ValueError("Not a compiled program of this version")
+    ops, positions, warnings, cells, prefixes = marshal.loads(zlib.decompress(data[5:]))
+    program = interpreter.Program(ops, array("q", positions))
+    program.warnings = warnings
+    program.cells = cells
+    if prefixes:
+        program.prefixes = {options: None if prefix is None else partial.Prefix.loads(prefix)
+                            for options, prefix in prefixes.items()}
+    return program
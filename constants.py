@@ -16,6 +16,9 @@ class Appearance():
     light_brace = "#6f42c1"
     light_value = "#005cc5"
     light_comment = "#0d1117"
+    light_debug = "#fff5b1"
+    light_warning = "#e36209"
+    light_heat = ("#f7f7e8", "#f7f3d0", "#f9ecb8", "#fbe2a0", "#fcd68a", "#fdc776", "#fdb464", "#fb9d56", "#f7824c", "#f16446")
     
     
     dark_bg = "#0d1117"
@@ -27,6 +30,9 @@ class Appearance():
     dark_brace = "#d2a8ff"
     dark_value = "#79c0ff"
     dark_comment = "#767d87"
+    dark_debug = "#3b3a1c"
+    dark_warning = "#ffab70"
+    dark_heat = ("#161b1f", "#1f2420", "#2a2c21", "#363421", "#433c21", "#514320", "#60491f", "#704d1e", "#814f1d", "#94501c")
     
     @classmethod
     def change_appearance(cls, dark_mode):
@@ -40,6 +46,9 @@ class Appearance():
             cls.brace = cls.dark_brace
             cls.value = cls.dark_value
             cls.comment = cls.dark_comment
+            cls.heat = cls.dark_heat
+            cls.debug = cls.dark_debug
+            cls.warning = cls.dark_warning
         else:
             cls.bg = cls.light_bg
             cls.fg = cls.light_fg
@@ -50,6 +59,9 @@ class Appearance():
             cls.brace = cls.light_brace
             cls.value = cls.light_value
             cls.comment = cls.light_comment
+            cls.heat = cls.light_heat
+            cls.debug = cls.light_debug
+            cls.warning = cls.light_warning
 
 if platform.system() == "darwin":
     new_accel = "Cmd+N"
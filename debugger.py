@@ -0,0 +1,146 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import bisect
+
+import interpreter
+from interpreter import OPEN, CLOSE, BREAK
+from tape import Tape
+
+
+class Debugger:
+    """
+    Step through a program. The breakpoints are compiled into the op list
+    as BREAK ops (like an int3), so the program runs at full speed between
+    them, without checking a breakpoint set at every op. A # in the source
+    is a breakpoint too
+    """
+    def __init__(self, source, input, output, cell_bits=8, grow_left=False, eof=0):
+        # The idioms would hide the iterations of the loops
+        program = interpreter.compile_program(source, idioms=False)
+        self.ops = list(program.ops)
+        self.original = program.ops
+        self.positions = program.positions
+        self.input = input
+        self.output = output
+        self.eof = eof
+        self.tape = Tape(cell_bits, grow_left)
+        self.position = 0
+        self.pointer = 0
+        self.breakpoints = set()
+        self.control = interpreter.Control()
+        self.marked = [index for index, char in enumerate(source) if char == "#"]
+        self.set_breakpoints(())
+
+    @property
+    def finished(self):
+        return self.position >= len(self.ops)
+
+    @property
+    def source_position(self):
+        """The source position of the next op"""
+        return self.positions[self.position] if not self.finished else None
+
+    def _op_index(self, position):
+        """The first op at or after the source position"""
+        return bisect.bisect_left(self.positions, position)
+
+    def _patch(self, index):
+        if index < len(self.ops):
+            self.ops[index] = (BREAK, self.original[index])
+
+    def _unpatch(self, index):
+        if index < len(self.ops) and index not in self.breakpoints:
+            self.ops[index] = self.original[index]
+
+    def add_breakpoint(self, position):
+        index = self._op_index(position)
+        self.breakpoints.add(index)
+        self._patch(index)
+
+    def remove_breakpoint(self, position):
+        index = self._op_index(position)
+        self.breakpoints.discard(index)
+        self._unpatch(index)
+
+    def set_breakpoints(self, positions):
+        """Replace the breakpoints with these ones, and the # marks"""
+        for index in list(self.breakpoints):
+            self.breakpoints.discard(index)
+            self._unpatch(index)
+        for position in self.marked + list(positions):
+            self.add_breakpoint(position)
+
+    def _run(self, temporary=()):
+        """
+        Run until a breakpoint. If the current op is a breakpoint, it's
+        executed first, as the user already stopped on it
+        """
+        temporary = [index for index in temporary if index not in self.breakpoints]
+        for index in temporary:
+            self._patch(index)
+
+        current = self.position
+        if not self.finished and self.ops[current][0] == BREAK and current not in temporary:
+            self.ops[current] = self.original[current]
+        else:
+            current = None
+
+        self.control.stop = False
+        try:
+            self.position, self.pointer, steps = interpreter.resume(
+                self.ops, self.positions, self.tape, self.position, self.pointer,
+                self.input, self.output, self.eof, control=self.control,
+            )
+        finally:
+            if current is not None:
+                self._patch(current)
+            for index in temporary:
+                self._unpatch(index)
+
+    def _successors(self):
+        command, argument = self.original[self.position]
+        if command in (OPEN, CLOSE):
+            return (self.position + 1, argument + 1)
+        return (self.position + 1,)
+
+    def _leave_breakpoint(self):
+        """
+        Step off the current op first, so its breakpoint stays armed if the
+        program gets back to it. Returns False if the step landed on another
+        breakpoint
+        """
+        if self.ops[self.position][0] == BREAK:
+            self.step()
+            return not self.finished and self.position not in self.breakpoints
+        return True
+
+    def continue_(self):
+        if not self.finished and self._leave_breakpoint():
+            self._run()
+
+    def step(self):
+        """Execute one op"""
+        if not self.finished:
+            self._run(self._successors())
+
+    def step_over(self):
+        """Run the whole loop if the next op is a [, otherwise execute one op"""
+        if self.finished:
+            return
+        command, argument = self.original[self.position]
+        if command == OPEN:
+            self._run((argument + 1,))
+        else:
+            self.step()
+
+    def run_to(self, position):
+        """Run until the first op at or after the source position"""
+        if not self.finished and self._leave_breakpoint():
+            self._run((self._op_index(position),))
+
+    def pause(self):
+        self.control.stop = True
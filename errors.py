@@ -0,0 +1,39 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+
+class BrainfuckError(Exception):
+    """Base class of the errors of a Brainfuck program. Position is the offset in the source code"""
+    message = "Error"
+
+    def __init__(self, position=None):
+        Exception.__init__(self, position)
+        self.position = position
+
+    def __str__(self):
+        if self.position is None:
+            return self.message
+        return "{} at position {}".format(self.message, self.position)
+
+
+class UnbalancedBracketError(BrainfuckError):
+    def __init__(self, bracket, position=None):
+        Exception.__init__(self, bracket, position)
+        self.position = position
+        self.bracket = bracket
+        self.message = "Unmatched {}".format(bracket)
+
+
+class TapeUnderflowError(BrainfuckError):
+    message = "Range error: the pointer moved left from the first cell"
+
+
+class StepLimitError(BrainfuckError):
+    message = "Step limit exceeded"
+
+
+class TapeLimitError(BrainfuckError):
+    message = "Tape limit exceeded"
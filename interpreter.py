@@ -4,77 +4,524 @@ License: GNU GPLv3
 Copyright: 2021 rdbende
 """
 
+import io
+import re
 import sys
+import bisect
+import argparse
+from array import array
 
-stop = False
-running = False
-
-def exit():
-    sys.exit()
-    running = False
-
-def execute(file):
-    global stop
-    global running
-    stop = False
-    running = True
-    with open(file) as program:
-        program_content = program.read()
-        
-    position = 0
-    pointer = 0
-    memory = [0]
-
-    bracemap = build_bracemap(program_content)
-    
-    while position < len(program_content):
-        if program_content[position] == ">":
-            pointer += 1
-            if len(memory) <= pointer:
-                memory.append(0)
-                
-        elif program_content[position] == "<":
-            pointer -= 1
-            if pointer < 0:
-                print("Range error")
-                exit()
-
-        elif program_content[position] == "+":
-            memory[pointer] += 1
-            if memory[pointer] > 255:
+from errors import BrainfuckError, UnbalancedBracketError, TapeUnderflowError, StepLimitError, TapeLimitError
+from tape import Tape, scan, CHUNK as TAPE_CHUNK
+
+# Opcodes of the intermediate representation. The compiler folds the
+# source into a list of (opcode, argument) tuples, so the interpreter
+# doesn't have to look at comments and single characters anymore
+ADD = 0         # add argument to the current cell
+MOVE = 1        # move the pointer by argument
+SET_ZERO = 2    # [-] and [+]
+OUTPUT = 3
+INPUT = 4
+OPEN = 5        # argument is the index of the matching CLOSE
+CLOSE = 6       # argument is the index of the matching OPEN
+MULTIPLY = 7    # [->+>++<<], argument is (((offset, factor), ...), lowest, highest)
+SCAN = 8        # [>] and [<<], argument is the stride
+BREAK = 9       # Breakpoint patched in by the debugger, argument is the original op
+
+# Bump this when the compiler output changes, so the cached programs of
+# the earlier versions aren't used anymore
+OPTIMIZER_VERSION = 5
+
+# The comment before a token is skipped in one go, which is a lot faster
+# than trying every token at every character of a long comment
+_tokens = re.compile(r"[^-+<>.,\[\]]*([+-]+|<+|>+|[.,\[\]])")
+_brackets = re.compile(r"[\[\]]")
+
+CHUNK = 1 << 20 # Characters read at once by compile_file
+
+# Returned by an input callable when there is no input yet. The run
+# returns before the , and reads again when it's continued
+WAIT = object()
+
+
+class Program:
+    def __init__(self, ops, positions):
+        self.ops = ops
+        self.positions = positions # Source position of every op
+        self.code = {} # The translated code of the jit, so a cached program isn't translated again
+        self.warnings = [] # (position, message) pairs of the analyzer
+        self.cells = None # The tape size the program surely fits in, if the analyzer could tell
+        self.prefixes = {} # (cell bits, grow left): the partial.Prefix the runs start from, or None
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def compile_program(code, idioms=True, analyze=True):
+    """
+    Strip the comments from the code, fold the runs of +- and <> into
+    single ADD and MOVE ops, and resolve the jump targets. Without idioms
+    every loop is kept as a loop (the debugger steps through them), and
+    the analyzer doesn't remove the dead code. Without analyze the idioms
+    are used, but the dead code is kept too, so every command of the source
+    belongs to the op before it (the profiler counts them like that)
+    """
+    return compile_chunks((code,), idioms, analyze)
+
+
+def compile_file(path, idioms=True, chunk=CHUNK):
+    """
+    Compile a file without reading it into memory at once. The comments
+    are dropped chunk by chunk, so a huge generated program, which is
+    mostly comments, only takes as much memory as its commands
+    """
+    def chunks():
+        with open(path) as file:
+            while True:
+                text = file.read(chunk)
+                if not text:
+                    break
+                yield text
+    return compile_chunks(chunks(), idioms)
+
+
+def compile_chunks(chunks, idioms=True, analyze=True):
+    """
+    Compile the code given in pieces. A run of +-<> cut in two by a chunk
+    boundary is folded together like any other run
+    """
+    ops, positions, stack = [], array("q"), []
+    base = 0
+
+    for code in chunks:
+        base = _compile_chunk(code, base, ops, positions, stack, idioms)
+
+    if stack:
+        raise UnbalancedBracketError("[", positions[stack[-1]])
+
+    if idioms and analyze:
+        import analyzer # analyzer imports this module
+        return analyzer.optimize(Program(ops, positions))
+    return Program(ops, positions)
+
+
+def _compile_chunk(code, base, ops, positions, stack, idioms):
+    """Compile a piece of code into the ops, and return the position after it"""
+    for token in _tokens.finditer(code):
+        text = token.group(1)
+        command = text[0]
+        start = base + token.start(1)
+
+        if command in "+-":
+            value = text.count("+") - text.count("-")
+            if ops and ops[-1][0] == ADD:
+                value += ops[-1][1]
+                ops.pop()
+                position = positions.pop()
+            else:
+                position = start
+            if value:
+                ops.append((ADD, value))
+                positions.append(position)
+
+        elif command in "<>":
+            value = len(text) if command == ">" else -len(text)
+            # Only the moves in one direction are folded, so a pointer which
+            # leaves the tape on the way (like <> at the first cell) still fails
+            if ops and ops[-1][0] == MOVE and (ops[-1][1] > 0) == (value > 0):
+                value += ops[-1][1]
+                ops.pop()
+                position = positions.pop()
+            else:
+                position = start
+            if value:
+                ops.append((MOVE, value))
+                positions.append(position)
+
+        elif command == ".":
+            ops.append((OUTPUT, None))
+            positions.append(start)
+
+        elif command == ",":
+            ops.append((INPUT, None))
+            positions.append(start)
+
+        elif command == "[":
+            stack.append(len(ops))
+            ops.append((OPEN, None))
+            positions.append(start)
+
+        else:
+            if not stack:
+                raise UnbalancedBracketError("]", start)
+            open_index = stack.pop()
+            idiom = idioms and _loop_idiom(ops[open_index + 1:])
+            if idiom:
+                del ops[open_index:], positions[open_index + 1:]
+                ops.append(idiom)
+            else:
+                ops[open_index] = (OPEN, len(ops))
+                ops.append((CLOSE, open_index))
+                positions.append(start)
+
+    return base + len(code)
+
+
+def _loop_idiom(body):
+    """
+    Recognize the loops which can be run as a single op. The body can't
+    contain any I/O or loop, only ADD and MOVE ops
+    """
+    if len(body) == 1 and body[0][0] == ADD and body[0][1] % 2:
+        # Adding an odd number always reaches zero sometime
+        return (SET_ZERO, None)
+
+    if len(body) == 1 and body[0][0] == MOVE:
+        return (SCAN, body[0][1])
+
+    offset, changes = 0, {}
+    lowest = highest = 0 # Every cell the pointer passes, not only the changed ones
+    for command, argument in body:
+        if command == ADD:
+            changes[offset] = changes.get(offset, 0) + argument
+        elif command == MOVE:
+            offset += argument
+            lowest, highest = min(lowest, offset), max(highest, offset)
+        else:
+            return None
+
+    # The pointer must return to the counter cell, which must step by one
+    counter = changes.pop(0, 0)
+    if offset != 0 or counter not in (1, -1):
+        return None
+
+    # Counting up from v takes -v iterations (modulo the cell size), so
+    # flipping the factors lets both directions use the counter's value
+    factors = tuple((offset, -factor * counter) for offset, factor in sorted(changes.items()) if factor)
+    return (MULTIPLY, (factors, lowest, highest))
+
+
+class Control:
+    """
+    The stop flag of a run. Every run has its own, instead of a module
+    global, so several programs can run side by side in threads
+    """
+    __slots__ = ("stop",)
+
+    def __init__(self):
+        self.stop = False
+
+    def cancel(self):
+        self.stop = True
+
+
+class Interpreter(Control):
+    """
+    A compiled program with its own machine state, which can be run in
+    slices, paused from another thread and resumed later. The jit backend
+    can only run the program to the end, and pausing it cancels it
+
+    If the input-independent start of the program was evaluated already
+    for these options (see partial.py), the interpreter backend starts
+    from its end, and its output is written first
+    """
+    __slots__ = ("program", "tape", "position", "pointer", "input", "output", "eof",
+                 "steps", "max_cells", "backend", "running", "cancelled", "waiting", "prefix")
+
+    def __init__(self, program, input, output, cell_bits=8, grow_left=False, eof=0, max_steps=None, max_cells=None,
+                 backend="interpreter"):
+        Control.__init__(self)
+        self.program = program
+        self.tape = Tape(cell_bits, grow_left, program.cells or TAPE_CHUNK, max_cells=max_cells)
+        self.position = 0
+        self.pointer = 0
+        self.input = input
+        self.output = output
+        self.eof = eof
+        self.steps = sys.maxsize if max_steps is None else max_steps
+        self.max_cells = max_cells
+        self.backend = backend
+        self.running = False
+        self.cancelled = False
+        self.waiting = False # The input returned WAIT
+        self.prefix = program.prefixes.get((cell_bits, grow_left)) if backend == "interpreter" else None
+
+    @property
+    def finished(self):
+        return self.position >= len(self.program.ops)
+
+    def run(self):
+        """Run until the end. Returns False if the program was paused or cancelled"""
+        return self.run_steps(None)
+
+    def run_steps(self, count):
+        """
+        Run about count ops (all of them if it's None), and return True if
+        the program ended. Like max_steps, the count is only checked when a
+        loop jumps back
+        """
+        if self.cancelled or self.finished:
+            return self.finished
+        if self.backend == "jit":
+            return self._run_jit(count)
+        if self.prefix is not None:
+            prefix, self.prefix = self.prefix, None
+            if prefix.apply(self) and self.finished:
+                return True
+
+        budget = self.steps if count is None else min(count, self.steps)
+        self.running = True
+        try:
+            self.position, self.pointer, left = resume(
+                self.program.ops, self.program.positions, self.tape, self.position, self.pointer,
+                self.input, self.output, self.eof, budget, self,
+            )
+        finally:
+            self.running = False
+        self.steps -= budget - left
+        # The other reasons to return are the end, the stop flag and the budget
+        self.waiting = left >= 0 and not self.stop and not self.finished
+        if self.steps < 0:
+            # The budget runs out at the back-edge of a loop, and the
+            # position is the first op of its body
+            close = self.program.ops[self.position - 1][1]
+            raise StepLimitError(self.program.positions[close])
+        return self.finished
+
+    def _run_jit(self, count):
+        if count is not None:
+            raise ValueError("The jit can only run the whole program")
+        import jit # jit imports this module
+        self.running = True
+        try:
+            finished = jit.run_program(self.program, self.input, self.output, self.tape.cell_bits, self.tape.grow_left,
+                                       self.eof, None if self.steps == sys.maxsize else self.steps, self.max_cells, self)
+        finally:
+            self.running = False
+        if finished:
+            self.position = len(self.program.ops)
+        else:
+            self.cancelled = True
+        return finished
+
+    def pause(self):
+        """Stop the run at the next loop back-edge. It stays paused until resume"""
+        self.stop = True
+
+    def resume(self):
+        self.stop = False
+        return self.run()
+
+    def cancel(self):
+        self.cancelled = True
+        self.stop = True
+
+
+def run_program(program, input, output, cell_bits=8, grow_left=False, eof=0, max_steps=None, max_cells=None):
+    """
+    Run a compiled program. input is called with no arguments and returns
+    the next value, or None at the end of the input, output is called with
+    the value of the cell. The eof argument is the value stored by , at
+    the end of the input (0 or -1), or None to leave the cell unchanged
+
+    max_steps limits the number of executed ops. It's only checked when a
+    loop jumps back, and every iteration costs the length of the loop
+    body, so the check is nearly free
+    """
+    Interpreter(program, input, output, cell_bits, grow_left, eof, max_steps, max_cells).run()
+
+
+_never = Control()
+
+
+def resume(ops, positions, tape, position, pointer, input, output, eof=0, steps=sys.maxsize, control=_never):
+    """
+    Run the ops from the given state, until the end, a BREAK op, the stop
+    flag of control, or until steps runs out. Returns the (position,
+    pointer, steps) to continue from; steps is negative if it ran out
+    """
+    memory = tape.cells
+    size = len(memory)
+    mask = tape.mask
+    length = len(ops)
+
+    try:
+        while position < length:
+            command, argument = ops[position]
+
+            if command == ADD:
+                memory[pointer] = (memory[pointer] + argument) & mask
+
+            elif command == MOVE:
+                pointer += argument
+                if not 0 <= pointer < size:
+                    pointer += tape.grow(pointer)
+                    memory, size = tape.cells, len(tape.cells)
+
+            elif command == OPEN:
+                if memory[pointer] == 0:
+                    position = argument
+
+            elif command == CLOSE:
+                if memory[pointer] != 0:
+                    steps -= position - argument
+                    position = argument
+                    if steps < 0:
+                        return position + 1, pointer, steps
+                if control.stop:
+                    return position + 1, pointer, steps
+
+            elif command == SET_ZERO:
                 memory[pointer] = 0
-                
-        elif program_content[position] == "-":
-            memory[pointer] -= 1
-            if memory[pointer] < 0:
-                memory[pointer] = 255
-                
-        elif program_content[position] == ".":
-            print(chr(memory[pointer]), end="")
-            
-        elif program_content[position] == ",":
-            memory[pointer] = ord(input()[0])
-
-        elif program_content[position] == "[" and memory[pointer] == 0:
-            try:
-                position = bracemap[position]
-            except KeyError:
-                print("Key Error")
-                exit()
-            
-        elif program_content[position] == "]" and memory[pointer] != 0:
-            try:
-                position = bracemap[position]
-            except KeyError:
-                print("Key Error")
-                exit()
-                
-        if stop:
-            exit()
-        
-        position += 1
-    running = False
-    exit()
+
+            elif command == MULTIPLY:
+                value = memory[pointer]
+                if value:
+                    factors, lowest, highest = argument
+                    if pointer + lowest < 0 or pointer + highest >= size:
+                        pointer += tape.grow(pointer + lowest)
+                        tape.grow(pointer + highest)
+                        memory, size = tape.cells, len(tape.cells)
+                    for offset, factor in factors:
+                        memory[pointer + offset] = (memory[pointer + offset] + value * factor) & mask
+                    memory[pointer] = 0
+
+            elif command == SCAN:
+                if memory[pointer]:
+                    pointer = scan(memory, pointer, argument)
+                    if not 0 <= pointer < size:
+                        pointer += tape.grow(pointer)
+                        memory, size = tape.cells, len(tape.cells)
+
+            elif command == OUTPUT:
+                output(memory[pointer])
+
+            elif command == INPUT:
+                value = input()
+                if value is not None:
+                    if value is WAIT:
+                        return position, pointer, steps
+                    memory[pointer] = value & mask
+                elif eof is not None:
+                    memory[pointer] = eof & mask
+
+            elif command == BREAK:
+                return position, pointer, steps
+
+            position += 1
+    except (TapeUnderflowError, TapeLimitError) as error:
+        error.position = positions[position]
+        raise
+    return position, pointer, steps
+
+
+def text_input(stream):
+    """Read the characters of a text stream as input values"""
+    def read():
+        char = stream.read(1)
+        return ord(char) if char else None
+    return read
+
+
+def polled_input(stream):
+    """
+    Read the characters of a stream without blocking. stream.poll()
+    returns a character, an empty string at the end of the input, or None
+    if there's nothing to read yet
+    """
+    def read():
+        char = stream.poll()
+        if char is None:
+            return WAIT
+        return ord(char) if char else None
+    return read
+
+
+def text_output(stream):
+    write = stream.write
+    # The wide cells can hold values which aren't characters
+    return lambda value: write(chr(value) if value <= 0x10FFFF else "\ufffd")
+
+
+def byte_input(stream, flush=None):
+    """
+    Read the bytes of a binary stream as input values. The flush stream
+    is flushed before every read, so the prompts are shown
+    """
+    def read():
+        if flush is not None:
+            flush.flush()
+        byte = stream.read(1)
+        return byte[0] if byte else None
+    return read
+
+
+def byte_output(stream, cell_bits=8, flush_lines=False):
+    """With flush_lines the stream is flushed after every newline, so a pipe shows the output as it's written"""
+    write = stream.write
+    if flush_lines:
+        flush = stream.flush
+
+        def output(value):
+            value &= 255
+            write(bytes((value,)))
+            if value == 10:
+                flush()
+        return output
+    if cell_bits > 8:
+        return lambda value: write(bytes((value & 255,)))
+    return lambda value: write(bytes((value,)))
+
+
+def _backend(name):
+    if name == "jit":
+        import jit # jit imports this module
+        return jit.run_program
+    return run_program
+
+
+def run(source, input_bytes=b"", backend="interpreter", cell_bits=8, grow_left=False, eof=0, max_steps=None, max_cells=None):
+    """
+    Run the source code (or an already compiled Program) with the given
+    input, and return the output as bytes. Wider cells are written modulo
+    256. Errors are raised as BrainfuckError subclasses
+    """
+    output = bytearray()
+    append = output.append
+    _backend(backend)(
+        source if isinstance(source, Program) else compile_program(source),
+        byte_input(io.BytesIO(input_bytes)),
+        append if cell_bits == 8 else lambda value: append(value & 255),
+        cell_bits,
+        grow_left,
+        eof,
+        max_steps,
+        max_cells,
+    )
+    return bytes(output)
+
+
+class JumpTable:
+    """
+    The matching bracket of every bracket, in two arrays sorted by source
+    position, which take a fraction of the memory of a dict
+    """
+    def __init__(self, sources, targets):
+        self.sources = sources
+        self.targets = targets
+
+    def __getitem__(self, position):
+        index = bisect.bisect_left(self.sources, position)
+        if index == len(self.sources) or self.sources[index] != position:
+            raise KeyError(position)
+        return self.targets[index]
+
+    def __contains__(self, position):
+        index = bisect.bisect_left(self.sources, position)
+        return index < len(self.sources) and self.sources[index] == position
+
+    def __len__(self):
+        return len(self.sources)
 
 
 def build_bracemap(code):
@@ -82,17 +529,101 @@ def build_bracemap(code):
     The pre-parse of the braces can speed up interpretation terribly
     Credits for this function: github.com/pocmo/Python-Brainfuck
     """
-    temp, bracemap = [], {}
+    temp, sources, targets = [], array("q"), array("q")
+
+    for bracket in _brackets.finditer(code):
+        position = bracket.start()
+        if bracket.group() == "[":
+            temp.append(len(sources))
+            sources.append(position)
+            targets.append(-1)
+        else:
+            if not temp:
+                raise UnbalancedBracketError("]", position)
+            start = temp.pop()
+            targets[start] = position
+            sources.append(position)
+            targets.append(sources[start])
+    if temp:
+        raise UnbalancedBracketError("[", sources[temp[-1]])
+    return JumpTable(sources, targets)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m interpreter", description="Run a Brainfuck program without the IDE")
+    parser.add_argument("file", help="the program to run")
+    parser.add_argument("--backend", choices=("interpreter", "jit"), default="interpreter")
+    parser.add_argument("--cell-bits", type=int, choices=(8, 16, 32), default=8)
+    parser.add_argument("--grow-left", action="store_true", help="grow the tape to the left instead of a range error")
+    parser.add_argument("--eof", choices=("0", "-1", "unchanged"), default="0", help="the value , stores at the end of the input")
+    parser.add_argument("--max-steps", type=int, help="stop with an error after about this many ops")
+    parser.add_argument("--max-cells", type=int, help="stop with an error if the tape would grow above this")
+    parser.add_argument("--cache", metavar="DIR", help="keep the compiled programs in this directory")
+    parser.add_argument("--checkpoint", metavar="FILE", help="save the state of the run into this file regularly, and on Ctrl+C")
+    parser.add_argument("--checkpoint-interval", type=float, default=60, metavar="SECONDS")
+    parser.add_argument("--resume", metavar="FILE", help="continue a run from its checkpoint, with the same input")
+    parser.add_argument("--flush-lines", action="store_true", help="flush the output after every newline, even into a pipe")
+    args = parser.parse_args(argv)
+    if (args.checkpoint or args.resume) and args.backend == "jit":
+        parser.error("checkpoints only work with the interpreter backend")
 
     try:
-        for position, command in enumerate(code):
-            if command == "[": temp.append(position)
-            if command == "]":
-                start = temp.pop()
-                bracemap[start] = position
-                bracemap[position] = start
-        return bracemap
-    except IndexError:
-        print("Parse Error")
-        exit()
+        if args.cache:
+            from cache import ProgramCache # cache imports this module
+            compiled = ProgramCache(1, args.cache).get_file(args.file, prefix=None if args.backend == "jit" else (args.cell_bits, args.grow_left))
+        else:
+            compiled = compile_file(args.file)
+    except (BrainfuckError, OSError) as error:
+        print("{}: {}".format(args.file, error), file=sys.stderr)
+        return 1
+
+    stdout = sys.stdout.buffer
+    eof = None if args.eof == "unchanged" else int(args.eof)
+    try:
+        if args.checkpoint or args.resume:
+            if not _run_checkpointed(args, compiled, stdout, eof):
+                print("Stopped, the state is saved in {}".format(args.checkpoint or args.resume), file=sys.stderr)
+                return 1
+        else:
+            _backend(args.backend)(
+                compiled,
+                byte_input(sys.stdin.buffer, flush=stdout),
+                byte_output(stdout, args.cell_bits, args.flush_lines),
+                args.cell_bits,
+                args.grow_left,
+                eof,
+                args.max_steps,
+                args.max_cells,
+            )
+    except BrainfuckError as error:
+        stdout.flush()
+        print("{}: {}".format(args.file, error), file=sys.stderr)
+        return 1
+    finally:
+        stdout.flush()
+    return 0
+
+
+def _run_checkpointed(args, program, stdout, eof):
+    import signal
+    import snapshot # snapshot imports this module
+
+    input = snapshot.CountedInput(byte_input(sys.stdin.buffer, flush=stdout))
+    output = snapshot.CountedOutput(byte_output(stdout, args.cell_bits, args.flush_lines))
+    if args.resume:
+        state = snapshot.Snapshot.load(args.resume)
+        sys.stdin.buffer.read(state.input_offset) # The input is given again, skip what was read
+        machine = state.restore(program, input, output)
+        input.count, output.count = state.input_offset, state.output_offset
+    else:
+        machine = Interpreter(program, input, output, args.cell_bits, args.grow_left, eof, args.max_steps, args.max_cells)
+
+    # Stop at the next loop back-edge, where the state can be saved
+    signal.signal(signal.SIGINT, lambda *args: machine.pause())
+    signal.signal(signal.SIGTERM, lambda *args: machine.pause())
+    return snapshot.run_checkpointed(machine, args.checkpoint or args.resume, args.checkpoint_interval, input, output)
+
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import interpreter
+from errors import TapeUnderflowError, TapeLimitError, StepLimitError
+from tape import Tape, scan, CHUNK
+from interpreter import ADD, MOVE, SET_ZERO, OUTPUT, INPUT, OPEN, CLOSE, MULTIPLY, SCAN
+
+# Python can't nest more than 20 blocks in a function, so the loops
+# deeper than this are moved out into their own functions
+MAX_DEPTH = 16
+
+
+class _Translator:
+    def __init__(self, program, cell_bits, eof, counted):
+        self.ops = program.ops
+        self.positions = program.positions
+        self.mask = (1 << cell_bits) - 1
+        self.eof = eof
+        self.counted = counted
+
+    def translate(self):
+        functions = []
+        lines = ["def _main(memory, pointer):"]
+        depth = 1
+        stack = [] # The (lines, depth) to go back to at the end of the loops moved into functions
+        if not self.ops:
+            lines.append("    pass")
+
+        for position, (command, argument) in enumerate(self.ops):
+            indent = "    " * depth
+
+            if command == ADD:
+                lines.append(indent + "memory[pointer] = (memory[pointer] + {}) & {}".format(argument, self.mask))
+
+            elif command == MOVE:
+                lines.append(indent + "pointer += {}".format(argument))
+                if argument < 0:
+                    lines.append(indent + "if pointer < 0: pointer += grow(pointer, {}); memory = tape.cells".format(self.positions[position]))
+                else:
+                    lines.append(indent + "if pointer >= len(memory): grow(pointer, {}); memory = tape.cells".format(self.positions[position]))
+
+            elif command == SET_ZERO:
+                lines.append(indent + "memory[pointer] = 0")
+
+            elif command == MULTIPLY:
+                factors, lowest, highest = argument
+                lines.append(indent + "value = memory[pointer]")
+                lines.append(indent + "if value:")
+                if lowest < 0:
+                    lines.append(indent + "    if pointer + {0} < 0: pointer += grow(pointer + {0}, {1}); memory = tape.cells".format(lowest, self.positions[position]))
+                if highest > 0:
+                    lines.append(indent + "    if pointer + {0} >= len(memory): grow(pointer + {0}, {1}); memory = tape.cells".format(highest, self.positions[position]))
+                for offset, factor in factors:
+                    lines.append(indent + "    memory[pointer + {0}] = (memory[pointer + {0}] + value * {1}) & {2}".format(offset, factor, self.mask))
+                lines.append(indent + "    memory[pointer] = 0")
+
+            elif command == SCAN:
+                lines.append(indent + "if memory[pointer]:")
+                lines.append(indent + "    pointer = scan(memory, pointer, {})".format(argument))
+                lines.append(indent + "    if not 0 <= pointer < len(memory): pointer += grow(pointer, {}); memory = tape.cells".format(self.positions[position]))
+
+            elif command == OUTPUT:
+                lines.append(indent + "output(memory[pointer])")
+
+            elif command == INPUT:
+                lines.append(indent + "value = input()")
+                lines.append(indent + "if value is not None: memory[pointer] = value & {}".format(self.mask))
+                if self.eof is not None:
+                    lines.append(indent + "else: memory[pointer] = {}".format(self.eof & self.mask))
+
+            elif command == OPEN:
+                if depth >= MAX_DEPTH:
+                    name = "_loop{}".format(position)
+                    lines.append(indent + "pointer = {}(memory, pointer)".format(name))
+                    lines.append(indent + "memory = tape.cells")
+                    stack.append((lines, depth))
+                    lines = ["def {}(memory, pointer):".format(name)]
+                    functions.append(lines)
+                    depth = 1
+                    indent = "    "
+                lines.append(indent + "while memory[pointer]:")
+                depth += 1
+
+            elif command == CLOSE:
+                depth -= 1
+                indent = "    " * depth
+                # The back-edge of the loop, so the Stop button works
+                lines.append(indent + "    if control.stop: raise Stopped")
+                if self.counted:
+                    lines.append(indent + "    steps[0] -= {}".format(position - argument))
+                    lines.append(indent + "    if steps[0] < 0: raise StepLimitError({})".format(self.positions[position]))
+                if depth == 1 and stack:
+                    # The end of a loop which has its own function
+                    lines.append("    return pointer")
+                    lines.append("")
+                    lines, depth = stack.pop()
+
+        lines.append("    return pointer")
+        lines.append("")
+        for function in functions:
+            lines.extend(function)
+        return "\n".join(lines) + "\n"
+
+
+def translate(program, cell_bits=8, eof=0, counted=False):
+    """
+    Turn the compiled program into Python source code. The counted code
+    decrements the step budget at every loop back-edge
+    """
+    return _Translator(program, cell_bits, eof, counted).translate()
+
+
+def compile_code(program, cell_bits=8, eof=0, counted=False):
+    """Compile the program into a Python code object, kept on the program for these options"""
+    options = (cell_bits, eof, counted)
+    if options in program.code:
+        return program.code[options]
+    code = program.code[options] = compile(translate(program, cell_bits, eof, counted), "<brainfuck>", "exec")
+    return code
+
+
+class Stopped(Exception):
+    pass
+
+
+def run_program(program, input, output, cell_bits=8, grow_left=False, eof=0, max_steps=None, max_cells=None, control=None):
+    """
+    The same as interpreter.run_program, but with the translated code.
+    Returns False if the stop flag of control ended the run
+    """
+    tape = Tape(cell_bits, grow_left, program.cells or CHUNK, max_cells=max_cells)
+
+    def grow(index, position):
+        try:
+            return tape.grow(index)
+        except (TapeUnderflowError, TapeLimitError) as error:
+            error.position = position
+            raise
+
+    namespace = {
+        "control": control or interpreter.Control(),
+        "tape": tape,
+        "scan": scan,
+        "grow": grow,
+        "input": input,
+        "output": output,
+        "Stopped": Stopped,
+        "StepLimitError": StepLimitError,
+        "steps": [max_steps],
+    }
+    exec(compile_code(program, cell_bits, eof, max_steps is not None), namespace)
+    try:
+        namespace["_main"](tape.cells, 0)
+    except Stopped:
+        return False
+    return True
@@ -0,0 +1,262 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import sys
+
+from interpreter import ADD, MOVE, SET_ZERO, OUTPUT, INPUT, OPEN, CLOSE, MULTIPLY, SCAN
+from errors import TapeUnderflowError, StepLimitError, TapeLimitError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LANES = 1024 # Inputs run together by batch
+WIDTH = 256 # The first tape length, if the analyzer couldn't tell
+
+_dtypes = {8: "uint8", 16: "uint16", 32: "uint32"}
+_STRAIGHT = (ADD, MOVE, SET_ZERO)
+
+
+class _Block:
+    """
+    A run of ADD, MOVE and SET_ZERO ops, folded into the change of every
+    cell it touches: changes is a list of (offset, set, value), where set
+    means the cell becomes value, otherwise value is added to it
+    """
+    def __init__(self, ops, start):
+        offset = lowest = highest = 0
+        cells = {}
+        moves = [] # (op index, offset), to find where a lane left the tape
+        end = start
+        while end < len(ops) and ops[end][0] in _STRAIGHT:
+            command, argument = ops[end]
+            if command == ADD:
+                set, value = cells.get(offset, (False, 0))
+                cells[offset] = (set, value + argument)
+            elif command == SET_ZERO:
+                cells[offset] = (True, 0)
+            else:
+                offset += argument
+                lowest, highest = min(lowest, offset), max(highest, offset)
+                moves.append((end, offset))
+            end += 1
+        self.end = end
+        self.changes = [(cell, set, value) for cell, (set, value) in cells.items() if set or value]
+        self.move = offset
+        self.lowest = lowest
+        self.highest = highest
+        self.moves = moves
+
+
+class Lockstep:
+    """
+    Runs of one program over many inputs at once. Every lane (one input)
+    has its own row of a 2D tape, its own pointer and position. At every
+    step the lanes at the lowest position execute that op together, with
+    one array operation, so the lanes which took another way at a [ or ]
+    wait until the others catch up. The straight runs of +-<> are applied
+    as one block. Lanes which end, or stop with an error, are done
+
+    The tape can't grow to the left, and the output is written modulo 256,
+    like interpreter.run
+    """
+    def __init__(self, program, inputs, cell_bits=8, eof=0, max_steps=None, max_cells=None):
+        if numpy is None:
+            raise ImportError("The lockstep backend needs NumPy")
+        if cell_bits not in _dtypes:
+            raise ValueError("Cell width must be 8, 16 or 32 bits")
+        lanes = len(inputs)
+        self.program = program
+        self.dtype = numpy.dtype(_dtypes[cell_bits])
+        self.mask = (1 << cell_bits) - 1
+        self.eof = eof
+        self.max_cells = max_cells
+        width = program.cells or WIDTH
+        self.tape = numpy.zeros((lanes, width if max_cells is None else max(min(width, max_cells), 1)), self.dtype)
+        self.pointer = numpy.zeros(lanes, numpy.int64)
+        self.position = numpy.zeros(lanes, numpy.int64)
+        self.steps = numpy.full(lanes, sys.maxsize if max_steps is None else max_steps, numpy.int64)
+        self.outputs = [bytearray() for _ in range(lanes)]
+        self.errors = [None] * lanes
+        self.blocks = {}
+
+        # The inputs are the rows of a byte array, with a zero column at the end
+        self.lengths = numpy.array([len(data) for data in inputs], numpy.int64)
+        self.data = numpy.zeros((lanes, int(self.lengths.max(initial=0)) + 1), numpy.uint8)
+        for lane, data in enumerate(inputs):
+            self.data[lane, :len(data)] = numpy.frombuffer(data, numpy.uint8)
+        self.read = numpy.zeros(lanes, numpy.int64)
+
+        prefix = program.prefixes.get((cell_bits, False))
+        if prefix is not None and lanes:
+            self._apply(prefix)
+
+    def _apply(self, prefix):
+        """Start every lane from the end of the evaluated prefix of the program, like Prefix.apply"""
+        state = prefix.state
+        if prefix.steps > self.steps[0] or self.max_cells is not None and prefix.size > self.max_cells:
+            return
+        cells = numpy.frombuffer(state.cells, self.dtype.newbyteorder("<")).astype(self.dtype)
+        self._grow(max(state.start + len(cells), state.pointer + 1))
+        self.tape[:, state.start:state.start + len(cells)] = cells
+        self.pointer[:] = state.pointer
+        self.position[:] = state.position
+        self.steps -= prefix.steps
+        output = bytes(value & 255 for value in prefix.output)
+        for lane_output in self.outputs:
+            lane_output += output
+
+    def _grow(self, size):
+        width = self.tape.shape[1]
+        if size > width:
+            width = max(size, width * 2)
+            if self.max_cells is not None:
+                width = min(width, self.max_cells)
+            tape = numpy.zeros((self.tape.shape[0], width), self.dtype)
+            tape[:, :self.tape.shape[1]] = self.tape
+            self.tape = tape
+
+    def _fail(self, lanes, error):
+        for lane in lanes.tolist():
+            self.errors[lane] = error
+        self.position[lanes] = len(self.program.ops)
+
+    def _bounds(self, lanes, lowest, highest, position):
+        """
+        Stop the lanes whose cells from lowest to highest aren't all on the
+        tape, and grow it for the others. Returns the mask of the others
+        """
+        good = lowest >= 0
+        self._fail(lanes[~good], TapeUnderflowError(self.program.positions[position]))
+        if self.max_cells is not None:
+            over = good & (highest >= self.max_cells)
+            self._fail(lanes[over], TapeLimitError(self.program.positions[position]))
+            good &= ~over
+        if good.any():
+            self._grow(int(highest[good].max()) + 1)
+        return good
+
+    def run(self):
+        """Run every lane to its end. Returns the outputs (bytes) and the errors (None or a BrainfuckError)"""
+        ops = self.program.ops
+        positions = self.program.positions
+        length = len(ops)
+        position, pointer = self.position, self.pointer
+        mask = self.mask
+
+        while True:
+            running = position[position < length]
+            if not len(running):
+                break
+            pc = int(running.min())
+            lanes = numpy.flatnonzero(position == pc)
+            command, argument = ops[pc]
+
+            if command in _STRAIGHT:
+                block = self.blocks.get(pc)
+                if block is None:
+                    block = self.blocks[pc] = _Block(ops, pc)
+                start = pointer[lanes]
+                lowest, highest = start + block.lowest, start + block.highest
+                if (lowest < 0).any() or (highest >= self.tape.shape[1]).any():
+                    lanes, start = self._block_bounds(lanes, start, block)
+                tape = self.tape
+                for offset, set, value in block.changes:
+                    cells = start + offset
+                    if set:
+                        tape[lanes, cells] = value & mask
+                    else:
+                        tape[lanes, cells] += self.dtype.type(value & mask)
+                pointer[lanes] = start + block.move
+                position[lanes] = block.end
+                continue
+
+            cells = self.tape[lanes, pointer[lanes]]
+
+            if command == OPEN:
+                position[lanes] = numpy.where(cells == 0, argument + 1, pc + 1)
+
+            elif command == CLOSE:
+                back = cells != 0
+                position[lanes] = numpy.where(back, argument + 1, pc + 1)
+                jumped = lanes[back]
+                self.steps[jumped] -= pc - argument
+                over = self.steps[jumped] < 0
+                if over.any():
+                    self._fail(jumped[over], StepLimitError(positions[pc]))
+
+            elif command == OUTPUT:
+                outputs = self.outputs
+                for lane, value in zip(lanes.tolist(), (cells & 255).tolist()):
+                    outputs[lane].append(value)
+                position[lanes] = pc + 1
+
+            elif command == INPUT:
+                read = self.read[lanes]
+                has = read < self.lengths[lanes]
+                self.tape[lanes[has], pointer[lanes[has]]] = self.data[lanes[has], read[has]]
+                if self.eof is not None:
+                    self.tape[lanes[~has], pointer[lanes[~has]]] = self.eof & mask
+                self.read[lanes[has]] += 1
+                position[lanes] = pc + 1
+
+            elif command == MULTIPLY:
+                position[lanes] = pc + 1
+                lanes, cells = lanes[cells != 0], cells[cells != 0]
+                factors, lowest, highest = argument
+                start = pointer[lanes]
+                good = self._bounds(lanes, start + lowest, start + highest, pc)
+                lanes, start, cells = lanes[good], start[good], cells[good]
+                values = cells.astype(numpy.int64)
+                tape = self.tape
+                for offset, factor in factors:
+                    target = start + offset
+                    tape[lanes, target] = ((tape[lanes, target].astype(numpy.int64) + values * factor) & mask).astype(self.dtype)
+                tape[lanes, start] = 0
+
+            elif command == SCAN:
+                position[lanes] = pc + 1
+                lanes = lanes[cells != 0]
+                # Every lane moves a stride at a time until its cell is zero,
+                # the cells after the end of the tape are zero too
+                while len(lanes):
+                    start = pointer[lanes] + argument
+                    good = self._bounds(lanes, start, start, pc)
+                    lanes, start = lanes[good], start[good]
+                    pointer[lanes] = start
+                    lanes = lanes[self.tape[lanes, start] != 0]
+
+            else:
+                raise ValueError("The lockstep backend can't run op {}".format(command))
+
+        return [bytes(output) for output in self.outputs], self.errors
+
+    def _block_bounds(self, lanes, start, block):
+        """The lanes which leave the tape in the block stop at the MOVE where they do, like in resume"""
+        lowest, highest = start + block.lowest, start + block.highest
+        bad = (lowest < 0) | (False if self.max_cells is None else highest >= self.max_cells)
+        for lane, pointer in zip(lanes[bad].tolist(), start[bad].tolist()):
+            for index, offset in block.moves:
+                if pointer + offset < 0:
+                    self._fail(numpy.array([lane]), TapeUnderflowError(self.program.positions[index]))
+                    break
+                if self.max_cells is not None and pointer + offset >= self.max_cells:
+                    self._fail(numpy.array([lane]), TapeLimitError(self.program.positions[index]))
+                    break
+        lanes, start = lanes[~bad], start[~bad]
+        if len(lanes):
+            self._grow(int((start + block.highest).max()) + 1)
+        return lanes, start
+
+
+def run_lockstep(program, inputs, cell_bits=8, eof=0, max_steps=None, max_cells=None):
+    """
+    Run a compiled program with every input (bytes) at once. Returns the
+    list of outputs and the list of errors (None, or the BrainfuckError
+    the lane stopped with), in the order of the inputs
+    """
+    return Lockstep(program, inputs, cell_bits, eof, max_steps, max_cells).run()
@@ -0,0 +1,83 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import sys
+import marshal
+
+import interpreter
+import snapshot
+from errors import BrainfuckError
+
+PREFIX_STEPS = 1 << 17 # The budget of the evaluation, counted like max_steps (about 0.1 s)
+MAX_OUTPUT = 1 << 20 # Values of output kept at most
+
+
+class Prefix:
+    """
+    The start of a program which doesn't depend on the input: the state
+    at its first , (or where the budget ran out), the output until then,
+    and the steps it took. A run which starts from here skips all of it
+    """
+    def __init__(self, state, output, steps, size):
+        self.state = state # A Snapshot
+        self.output = output
+        self.steps = steps
+        self.size = size # The length of the tape, which max_cells would have limited
+
+    def apply(self, machine):
+        """
+        Start a fresh machine from the end of the prefix. Returns False (and
+        leaves the machine as it was) if the prefix runs into its limits,
+        so the error is raised by the run itself, at the right place
+        """
+        if self.steps > machine.steps or machine.max_cells is not None and self.size > machine.max_cells:
+            return False
+        steps = machine.steps
+        self.state.apply(machine)
+        machine.steps = steps - self.steps
+        output = machine.output
+        for value in self.output:
+            output(value)
+        return True
+
+    def dumps(self):
+        return marshal.dumps((self.state.dumps(), self.output, self.steps, self.size))
+
+    @classmethod
+    def loads(cls, data):
+        state, output, steps, size = marshal.loads(data)
+        return cls(snapshot.Snapshot.loads(state), output, steps, size)
+
+
+def evaluate(program, cell_bits=8, grow_left=False, steps=PREFIX_STEPS, max_output=MAX_OUTPUT):
+    """
+    Run the program until it reads its first input, under a step budget,
+    and keep the Prefix on the program for these options. It's None if the
+    program reads input right away, stops with an error before that, or
+    prints more than max_output values
+    """
+    output = []
+    machine = interpreter.Interpreter(program, lambda: interpreter.WAIT, None, cell_bits, grow_left)
+    machine.prefix = None
+
+    def write(value):
+        output.append(value)
+        if len(output) >= max_output:
+            machine.pause()
+
+    machine.output = write
+    prefix = None
+    try:
+        machine.run_steps(steps)
+    except BrainfuckError:
+        pass
+    else:
+        # A program which prints a lot isn't worth keeping
+        if machine.position and len(output) < max_output:
+            state = snapshot.Snapshot.take(machine)
+            prefix = Prefix(state, output, sys.maxsize - machine.steps, len(machine.tape))
+    program.prefixes[cell_bits, grow_left] = prefix
+    return prefix
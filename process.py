@@ -0,0 +1,98 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import os
+import sys
+import threading
+import subprocess
+
+_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpreter.py")
+
+
+class ChildProcess:
+    """
+    Run a program with the command-line interpreter in a child process, so
+    it doesn't share the GIL with the UI, and can be killed any time. The
+    output is passed to the output callback as bytes from a reader thread,
+    and on_exit is called with an error message (or None) when it ends
+    """
+    def __init__(self, file, output, on_exit=None, timeout=None, max_steps=None, max_cells=None,
+                 backend="interpreter", cell_bits=8, grow_left=False, eof=0, cache_dir=None):
+        self.output = output
+        self.on_exit = on_exit
+        self.timed_out = False
+
+        command = [sys.executable, _script, file, "--backend", backend, "--cell-bits", str(cell_bits),
+                   "--eof", "unchanged" if eof is None else str(eof), "--flush-lines"]
+        if grow_left:
+            command.append("--grow-left")
+        if max_steps:
+            command += ["--max-steps", str(max_steps)]
+        if max_cells:
+            command += ["--max-cells", str(max_cells)]
+        if cache_dir:
+            command += ["--cache", cache_dir]
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        self.timer = None
+        if timeout:
+            self.timer = threading.Timer(timeout, self.timeout)
+            self.timer.daemon = True
+            self.timer.start()
+
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    @property
+    def running(self):
+        return self.process.poll() is None
+
+    def _read(self):
+        stdout = self.process.stdout.fileno()
+        while True:
+            data = os.read(stdout, 65536)
+            if not data:
+                break
+            self.output(data)
+
+        error = self.process.stderr.read().decode(errors="replace").strip()
+        returncode = self.process.wait()
+        if self.timer:
+            self.timer.cancel()
+
+        if self.timed_out:
+            error = "Time limit exceeded"
+        elif returncode < 0:
+            error = "Killed"
+        elif not error:
+            error = None
+        if self.on_exit:
+            self.on_exit(error)
+
+    def write(self, data):
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass # The program has already finished
+
+    def close_input(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def timeout(self):
+        self.timed_out = True
+        self.kill()
+
+    def kill(self):
+        if self.running:
+            self.process.kill()
+
+    def wait(self, timeout=None):
+        self.reader.join(timeout)
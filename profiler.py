@@ -0,0 +1,219 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import sys
+import json
+import math
+import collections
+
+import interpreter
+from interpreter import ADD, MOVE, SET_ZERO, OUTPUT, INPUT, OPEN, CLOSE, MULTIPLY, SCAN
+from errors import BrainfuckError, TapeUnderflowError, TapeLimitError
+from tape import Tape, scan
+
+COMMANDS = set("+-<>[].,")
+HEAT_LEVELS = 10
+
+
+class Profile:
+    """
+    The result of a profiled run. Every count is keyed by source
+    position: ops is {(start, end): executions} for the compiled ops,
+    loops is {(open, close): iterations} for the bracket pairs of
+    build_bracemap, and cells is {cell: accesses}
+    """
+    def __init__(self, source, ops, loops, cells, commands):
+        self.source = source
+        self.ops = ops
+        self.loops = loops
+        self.cells = cells
+        self.commands = commands # Executed Brainfuck commands, as if they were run one by one
+
+    def hot_loops(self, count=10):
+        return sorted(self.loops.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def hot_spots(self, count=10):
+        return sorted(self.ops.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def heat(self):
+        """The (start, end, level) ranges of the executed code, on a logarithmic scale"""
+        if not self.ops:
+            return []
+        top = math.log(max(self.ops.values()) + 1)
+        return [(start, end, min(int(math.log(count + 1) / top * HEAT_LEVELS), HEAT_LEVELS - 1))
+                for (start, end), count in self.ops.items() if count]
+
+    def _snippet(self, start, end):
+        code = "".join(char for char in self.source[start:end] if char in COMMANDS)
+        return code if len(code) <= 40 else code[:37] + "..."
+
+    def report(self):
+        lines = ["Executed commands: {:,}".format(self.commands), "", "Hottest loops:"]
+        for (start, end), iterations in self.hot_loops():
+            lines.append("  {:>14,} iterations  at {}-{}  {}".format(iterations, start, end, self._snippet(start, end + 1)))
+        lines += ["", "Hottest code:"]
+        for (start, end), count in self.hot_spots():
+            lines.append("  {:>14,} times  at {}-{}  {}".format(count, start, end, self._snippet(start, end)))
+        lines += ["", "Most accessed cells:"]
+        for cell, count in self.cells.most_common(10):
+            lines.append("  {:>14,} accesses  cell {}".format(count, cell))
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        """Export the profile as JSON"""
+        data = {
+            "commands": self.commands,
+            "ops": [{"start": start, "end": end, "count": count} for (start, end), count in sorted(self.ops.items())],
+            "loops": [{"open": start, "close": end, "iterations": count} for (start, end), count in sorted(self.loops.items())],
+            "cells": {str(cell): count for cell, count in sorted(self.cells.items())},
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+
+
+def _counter_step(loop):
+    """The change of the counter cell in one iteration of an idiom loop"""
+    offset, step = 0, 0
+    for command in loop[1:-1]:
+        if command == ">":
+            offset += 1
+        elif command == "<":
+            offset -= 1
+        elif offset == 0 and command == "+":
+            step += 1
+        elif offset == 0 and command == "-":
+            step -= 1
+    return step
+
+
+def _code_end(source, start, end):
+    """The end of the commands of an op, without the comment after them"""
+    while end > start + 1 and source[end - 1] not in COMMANDS:
+        end -= 1
+    return end
+
+
+def profile(source, input, output, cell_bits=8, grow_left=False, eof=0, control=None):
+    """
+    Run the source like interpreter.run_program does, but count how many
+    times each op, loop and cell is used. It's a lot slower than a
+    normal run. It can be stopped with an interpreter.Control
+    """
+    control = control or interpreter.Control()
+    # The dead code is kept, or its commands would be counted with the op before it
+    program = interpreter.compile_program(source, analyze=False)
+    ops, positions = program.ops, program.positions
+    ends = list(positions[1:]) + [len(source)]
+    bracemap = interpreter.build_bracemap(source)
+
+    # The number of source commands each op stands for, and the change of
+    # the counter in the idiom loops, to know their iteration counts
+    spans = [sum(char in COMMANDS for char in source[start:end]) for start, end in zip(positions, ends)]
+    steps = {}
+    for index, (command, argument) in enumerate(ops):
+        if command in (SET_ZERO, MULTIPLY):
+            loop = "".join(char for char in source[positions[index]:bracemap[positions[index]] + 1] if char in COMMANDS)
+            steps[index] = pow(_counter_step(loop) % (1 << cell_bits), -1, 1 << cell_bits)
+
+    counts = [0] * len(ops)
+    iterations = [0] * len(ops)
+    cells = collections.Counter()
+    tape = Tape(cell_bits, grow_left)
+    memory = tape.cells
+    mask = tape.mask
+    pointer = position = commands = 0
+
+    try:
+        while position < len(ops):
+            command, argument = ops[position]
+            counts[position] += 1
+            commands += spans[position]
+            cells[pointer - tape.origin] += 1
+
+            if command == ADD:
+                memory[pointer] = (memory[pointer] + argument) & mask
+
+            elif command == MOVE:
+                pointer += argument
+                pointer += tape.grow(pointer)
+                memory = tape.cells
+
+            elif command == OPEN:
+                if memory[pointer] == 0:
+                    position = argument
+
+            elif command == CLOSE:
+                iterations[position] += 1
+                if memory[pointer] != 0:
+                    position = argument
+                if control.stop:
+                    break
+
+            elif command in (SET_ZERO, MULTIPLY):
+                value = memory[pointer]
+                if value:
+                    loops = -value * steps[position] & mask
+                    iterations[position] += loops
+                    commands += loops * (spans[position] - 1) - spans[position] + 1
+                    if command == MULTIPLY:
+                        factors, lowest, highest = argument
+                        pointer += tape.grow(pointer + lowest)
+                        tape.grow(pointer + highest)
+                        memory = tape.cells
+                        for offset, factor in factors:
+                            memory[pointer + offset] = (memory[pointer + offset] + value * factor) & mask
+                            cells[pointer + offset - tape.origin] += loops
+                    memory[pointer] = 0
+                else:
+                    commands -= spans[position] - 1
+
+            elif command == SCAN:
+                start = pointer
+                if memory[pointer]:
+                    pointer = scan(memory, pointer, argument)
+                    shift = tape.grow(pointer)
+                    pointer += shift
+                    start += shift
+                    memory = tape.cells
+                loops = abs(pointer - start) // abs(argument)
+                iterations[position] += loops
+                commands += loops * (spans[position] - 1) - spans[position] + 1
+                for cell in range(start, pointer, argument):
+                    cells[cell - tape.origin] += 1
+
+            elif command == OUTPUT:
+                output(memory[pointer])
+
+            elif command == INPUT:
+                value = input()
+                if value is not None:
+                    memory[pointer] = value & mask
+                elif eof is not None:
+                    memory[pointer] = eof & mask
+
+            position += 1
+    except (TapeUnderflowError, TapeLimitError) as error:
+        error.position = positions[position]
+        raise
+
+    op_counts, loops = {}, {}
+    for index, (command, argument) in enumerate(ops):
+        if command == CLOSE:
+            loops[(positions[argument], positions[index])] = iterations[index]
+        elif command in (SET_ZERO, MULTIPLY, SCAN):
+            loops[(positions[index], bracemap[positions[index]])] = iterations[index]
+        op_counts[(positions[index], _code_end(source, positions[index], ends[index]))] = counts[index]
+    return Profile(source, op_counts, loops, cells, commands)
+
+
+def profile_file(file, cell_bits=8, grow_left=False, eof=0, control=None):
+    """Profile a file in the IDE, with sys.stdin and sys.stdout as the I/O"""
+    try:
+        with open(file) as program:
+            source = program.read()
+        return profile(source, interpreter.text_input(sys.stdin), interpreter.text_output(sys.stdout), cell_bits, grow_left, eof, control)
+    except BrainfuckError as error:
+        print(error)
@@ -0,0 +1,91 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import time
+
+import interpreter
+
+TARGET = 0.01 # Seconds a slice should take
+
+
+class Slicer:
+    """
+    Run an Interpreter a slice at a time. The step count of the slices
+    follows the measured speed, so a slice takes about target seconds,
+    whether the program is made of short or long loops
+    """
+    def __init__(self, target=TARGET, steps=1000, lowest=100, highest=1 << 24):
+        self.target = target
+        self.steps = steps
+        self.lowest = lowest
+        self.highest = highest
+
+    def run(self, machine):
+        """Run one slice, and return True if the program ended"""
+        start = time.perf_counter()
+        finished = machine.run_steps(self.steps)
+        elapsed = time.perf_counter() - start
+        if not machine.waiting:
+            # Shrink fast, but grow slowly, as a single fast slice can be
+            # followed by a slower part of the program
+            scale = min(max(self.target / elapsed, 0.25), 1.25) if elapsed else 1.25
+            self.steps = min(max(int(self.steps * scale), self.lowest), self.highest)
+        return finished
+
+
+class _Buffer:
+    """The input of an async run. It's filled from the reader while the program waits"""
+    __slots__ = ("data", "index", "eof")
+
+    def __init__(self):
+        self.data = b""
+        self.index = 0
+        self.eof = False
+
+    def read(self):
+        if self.index < len(self.data):
+            self.index += 1
+            return self.data[self.index - 1]
+        return None if self.eof else interpreter.WAIT
+
+
+async def run_async(program, reader, writer, cell_bits=8, grow_left=False, eof=0, max_steps=None, max_cells=None,
+                    target=TARGET):
+    """
+    Run a compiled program in slices, and let the other tasks run between
+    them. reader is an asyncio.StreamReader (anything with an async
+    read(n)), writer is an asyncio.StreamWriter (write() and async
+    drain()). Only the interpreter backend can run in slices
+
+    Returns the Interpreter at the end. Cancelling the task stops the run;
+    errors are raised as BrainfuckError subclasses
+    """
+    import asyncio # It's slow to import, and the IDE only needs the Slicer
+    
+    buffer = _Buffer()
+    output = bytearray()
+    append = output.append
+    machine = interpreter.Interpreter(program, buffer.read, append if cell_bits == 8 else lambda value: append(value & 255),
+                                      cell_bits, grow_left, eof, max_steps, max_cells)
+    slicer = Slicer(target)
+
+    while True:
+        finished = slicer.run(machine)
+        if output:
+            writer.write(bytes(output))
+            output.clear()
+            await writer.drain()
+        if finished or machine.cancelled:
+            return machine
+
+        if machine.waiting:
+            data = await reader.read(4096)
+            if data:
+                buffer.data, buffer.index = data, 0
+            else:
+                buffer.eof = True
+        else:
+            await asyncio.sleep(0)
@@ -0,0 +1,207 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import os
+import sys
+import time
+import zlib
+import struct
+import marshal
+import hashlib
+from array import array
+
+import interpreter
+
+MAGIC = b"BFS"
+VERSION = 1
+CHECKPOINT_INTERVAL = 60 # Seconds
+
+# magic, version, cell bits, grow left, eof (0, -1 or 2 for unchanged),
+# position, pointer, steps, max cells (0 is no limit), first stored cell,
+# input offset, output offset, program digest, pending input length
+_header = struct.Struct("<3sBB?bqqqqqqq32sq")
+
+
+def digest(program):
+    return hashlib.sha256(marshal.dumps(program.ops)).digest()
+
+
+class Snapshot:
+    """
+    The whole state of an Interpreter between two slices. The pointer and
+    the cells are relative to the origin of the tape, and only the range
+    between the first and the last nonzero cell is stored, compressed.
+    The input and output offsets are the number of values read and
+    written so far, and pending is the input which was given, but not
+    read yet
+    """
+    def __init__(self, program_digest, position, pointer, steps, cell_bits, grow_left, eof, max_cells,
+                 start, cells, input_offset=0, output_offset=0, pending=b""):
+        self.program_digest = program_digest
+        self.position = position
+        self.pointer = pointer
+        self.steps = steps
+        self.cell_bits = cell_bits
+        self.grow_left = grow_left
+        self.eof = eof
+        self.max_cells = max_cells
+        self.start = start
+        self.cells = cells # Little-endian bytes
+        self.input_offset = input_offset
+        self.output_offset = output_offset
+        self.pending = pending
+
+    @classmethod
+    def take(cls, machine, input_offset=0, output_offset=0, pending=b""):
+        if machine.running:
+            raise RuntimeError("Can't take a snapshot of a running program")
+        tape = machine.tape
+        size = tape.cell_bits // 8
+        with memoryview(tape.cells) as view:
+            raw = view.cast("B").tobytes()
+        if sys.byteorder == "big" and size > 1:
+            raw = _swap(raw, tape.cell_bits)
+        end = len(raw.rstrip(b"\0"))
+        end += -end % size
+        first = min(len(raw) - len(raw.lstrip(b"\0")), end)
+        first -= first % size
+        return cls(digest(machine.program), machine.position, machine.pointer - tape.origin, machine.steps,
+                   tape.cell_bits, tape.grow_left, machine.eof, machine.max_cells,
+                   first // size - tape.origin, raw[first:end], input_offset, output_offset, pending)
+
+    def restore(self, program, input, output):
+        """An Interpreter which continues from this state"""
+        if digest(program) != self.program_digest:
+            raise ValueError("The snapshot was taken of another program")
+        machine = interpreter.Interpreter(program, input, output, self.cell_bits, self.grow_left, self.eof,
+                                          None, self.max_cells)
+        self.apply(machine)
+        return machine
+
+    def apply(self, machine):
+        """Put the cells, the pointer, the position and the steps into a machine which hasn't run yet"""
+        tape = machine.tape
+        size = self.cell_bits // 8
+        count = len(self.cells) // size
+        if count:
+            tape.grow(tape.origin + self.start)
+            tape.grow(tape.origin + self.start + count - 1)
+        tape.grow(tape.origin + self.pointer)
+        cells = self.cells
+        if sys.byteorder == "big" and size > 1:
+            cells = _swap(cells, self.cell_bits)
+        first = (tape.origin + self.start) * size
+        with memoryview(tape.cells) as view, view.cast("B") as raw:
+            raw[first:first + len(cells)] = cells
+        machine.position = self.position
+        machine.pointer = tape.origin + self.pointer
+        machine.steps = self.steps
+        machine.prefix = None # The state replaces the precomputed start of the program
+
+    def dumps(self):
+        eof = 2 if self.eof is None else self.eof
+        header = _header.pack(MAGIC, VERSION, self.cell_bits, self.grow_left, eof, self.position, self.pointer,
+                              self.steps, self.max_cells or 0, self.start, self.input_offset, self.output_offset,
+                              self.program_digest, len(self.pending))
+        return header + self.pending + zlib.compress(self.cells)
+
+    @classmethod
+    def loads(cls, data):
+        """Raises ValueError if the data isn't a whole snapshot of this version"""
+        if data[:3] != MAGIC or data[3:4] != bytes((VERSION,)):
+            raise ValueError("Not a snapshot of this version")
+        try:
+            (magic, version, cell_bits, grow_left, eof, position, pointer, steps, max_cells, start,
+             input_offset, output_offset, program_digest, pending) = _header.unpack_from(data)
+            offset = _header.size + pending
+            cells = zlib.decompress(data[offset:])
+        except (struct.error, zlib.error) as error:
+            raise ValueError("Broken snapshot: {}".format(error))
+        return cls(program_digest, position, pointer, steps, cell_bits, grow_left, None if eof == 2 else eof,
+                   max_cells or None, start, cells, input_offset, output_offset, data[_header.size:offset])
+
+    def save(self, path):
+        """Write the snapshot atomically, so a crash while saving doesn't destroy the earlier one"""
+        temp = path + ".tmp"
+        with open(temp, "wb") as file:
+            file.write(self.dumps())
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.loads(file.read())
+
+
+def _swap(data, cell_bits):
+    cells = array("H" if cell_bits == 16 else "I", data)
+    cells.byteswap()
+    return cells.tobytes()
+
+
+class CountedInput:
+    """Count the values read by an input callable, for the input offset of the snapshots"""
+    __slots__ = ("input", "count")
+
+    def __init__(self, input, count=0):
+        self.input = input
+        self.count = count
+
+    def __call__(self):
+        value = self.input()
+        if value is not None and value is not interpreter.WAIT:
+            self.count += 1
+        return value
+
+
+class CountedOutput:
+    """Count the values written by an output callable, for the output offset of the snapshots"""
+    __slots__ = ("output", "count")
+
+    def __init__(self, output, count=0):
+        self.output = output
+        self.count = count
+
+    def __call__(self, value):
+        self.count += 1
+        self.output(value)
+
+
+class Checkpointer:
+    """
+    Save a snapshot every interval seconds. Call it between the slices of
+    the run; it does nothing until the interval has passed
+    """
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def __call__(self, machine, input_offset=0, output_offset=0, pending=b"", force=False):
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            Snapshot.take(machine, input_offset, output_offset, pending).save(self.path)
+            self.last = now
+            return True
+        return False
+
+
+def run_checkpointed(machine, path, interval=CHECKPOINT_INTERVAL, input=None, output=None, steps=1 << 20):
+    """
+    Run the machine to the end in slices, saving a snapshot into path
+    every interval seconds, and when it's stopped. input and output are
+    the CountedInput and CountedOutput of the machine, if the offsets
+    should be saved. The snapshot is removed when the program ends
+    """
+    checkpoint = Checkpointer(path, interval)
+    while not machine.run_steps(steps):
+        stopped = machine.stop
+        checkpoint(machine, input.count if input else 0, output.count if output else 0, force=stopped)
+        if stopped:
+            return False
+    if os.path.exists(path):
+        os.remove(path)
+    return True
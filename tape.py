@@ -0,0 +1,126 @@
+"""
+Author: rdbende
+License: GNU GPLv3
+Copyright: 2021 rdbende
+"""
+
+import mmap
+from array import array
+
+from errors import TapeUnderflowError, TapeLimitError
+
+CHUNK = 30000 # The classic tape length, and the unit of growing
+MMAP_THRESHOLD = 64 * 1024 * 1024 # Bigger tapes are backed by an anonymous mmap
+
+_formats = {8: "B", 16: "H", 32: "I" if array("I").itemsize == 4 else "L"}
+
+
+class Tape:
+    """
+    The memory of the machine. The cells are kept in a flat buffer (a
+    bytearray for 8-bit cells), which is grown a chunk at a time, and
+    optionally to the left too, but never above max_cells. The interpreter
+    indexes the buffer directly, origin is where the cell 0 of the program
+    is in it
+    """
+    def __init__(self, cell_bits=8, grow_left=False, chunk=CHUNK, mmap_threshold=MMAP_THRESHOLD, max_cells=None):
+        if cell_bits not in _formats:
+            raise ValueError("Cell width must be 8, 16 or 32 bits")
+        self.cell_bits = cell_bits
+        self.mask = (1 << cell_bits) - 1
+        self.grow_left = grow_left
+        self.chunk = chunk
+        self.mmap_threshold = mmap_threshold
+        self.max_cells = max_cells
+        self.origin = 0
+        self.cells = self._allocate(chunk if max_cells is None else min(chunk, max_cells))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _allocate(self, size):
+        format = _formats[self.cell_bits]
+        itemsize = self.cell_bits // 8
+        if size * itemsize >= self.mmap_threshold:
+            buffer = mmap.mmap(-1, size * itemsize)
+            return buffer if itemsize == 1 else memoryview(buffer).cast(format)
+        if itemsize == 1:
+            return bytearray(size)
+        return array(format, bytes(size * itemsize))
+
+    def _zeros(self, size):
+        if self.cell_bits == 8:
+            return bytes(size)
+        return array(_formats[self.cell_bits], bytes(size * self.cell_bits // 8))
+
+    def grow(self, index):
+        """
+        Make the index valid in the buffer. Returns the number of cells
+        inserted before the old ones, the caller must shift its pointer
+        with it, and fetch the cells again, since they may be replaced
+        """
+        cells = self.cells
+        shift = 0
+        if index < 0:
+            if not self.grow_left:
+                raise TapeUnderflowError()
+            shift = -index + self.chunk - 1
+            shift -= shift % self.chunk
+            size = len(cells) + shift
+        elif index >= len(cells):
+            size = index + self.chunk
+            size -= size % self.chunk
+        else:
+            return 0
+
+        if self.max_cells is not None and size > self.max_cells:
+            if len(cells) + max(-index, index - len(cells) + 1) > self.max_cells:
+                raise TapeLimitError()
+            if shift:
+                shift = self.max_cells - len(cells)
+            size = self.max_cells
+
+        if isinstance(cells, (bytearray, array)) and size * self.cell_bits // 8 < self.mmap_threshold:
+            if shift:
+                cells[0:0] = self._zeros(shift)
+            cells.extend(self._zeros(size - len(cells)))
+        else:
+            new = self._allocate(size)
+            new[shift:shift + len(cells)] = cells
+            self.cells = new
+        self.origin += shift
+        return shift
+
+    def values(self, start=0, end=None):
+        """The cell values relative to the origin of the tape"""
+        end = len(self.cells) - self.origin if end is None else end
+        return list(self.cells[max(self.origin + start, 0):max(self.origin + end, 0)])
+
+
+def scan(cells, pointer, stride):
+    """
+    Find the first zero cell from the pointer in the direction of the
+    stride. If there's none, the position is outside of the buffer
+    """
+    if hasattr(cells, "find"):
+        # bytearray and mmap search in C
+        if stride == 1:
+            found = cells.find(b"\0", pointer)
+            return len(cells) if found < 0 else found
+        if stride == -1:
+            return cells.rfind(b"\0", 0, pointer + 1)
+
+    elif stride == 1 and isinstance(cells, array):
+        try:
+            return cells.index(0, pointer)
+        except ValueError:
+            return len(cells)
+
+    # The slice walks the tape from the pointer in the direction of the stride
+    part = cells[pointer::stride]
+    if isinstance(part, memoryview):
+        part = part.tolist()
+    try:
+        return pointer + part.index(0) * stride
+    except ValueError:
+        return pointer + len(part) * stride
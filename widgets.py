@@ -7,18 +7,20 @@ Copyright: 2021 rdbende
 import tkinter as tk
 from tkinter import ttk
 from tkinter import font as tkfont
-import webbrowser
-import interpreter
+import os
+import re
+import hashlib
 import sys
-try:
-    from pygments import lex
-    from pygments.lexers import BrainfuckLexer
-    pygments = True
-except ImportError:
-    pygments = False
+import collections
+import threading
 
 
 class Input(tk.Frame):
+    """
+    Pressing Enter puts the whole line with a newline into a queue, and
+    the interpreter reads from it character by character. Ctrl+D closes
+    the input (the program gets EOF)
+    """
     def __init__(self, *args, **kwargs):
         tk.Frame.__init__(self, *args, **kwargs)
         
@@ -31,43 +33,143 @@ class Input(tk.Frame):
         self.scrollbar.config(command=self.text.yview)
         
         sys.stdin = self
-        self.enter_pressed = False
+        self.queue = collections.deque()
+        self.eof = False
+        self.cancelled = False
+        self.condition = threading.Condition()
         
         def enter(*args):
-            self.enter_pressed = True
+            self.feed(self.text.get("insert linestart", "insert lineend") + "\n")
+                
+        def end_of_file(*args):
+            with self.condition:
+                self.eof = True
+                self.condition.notify_all()
+            return "break"
             
         self.text.bind("<Return>", enter)
+        self.text.bind("<Control-d>", end_of_file)
         
     def write(self, content):
         self.text.insert("end", content)
         
+    def feed(self, text):
+        """Put text into the input queue, as if it was typed"""
+        with self.condition:
+            self.queue.extend(text)
+            self.condition.notify_all()
+        
+    def pending(self):
+        """The input which was entered, but not read yet"""
+        with self.condition:
+            return "".join(self.queue)
+        
+    def _ready(self):
+        return self.queue or self.eof or self.cancelled
+        
+    def read(self, size=1):
+        """Block until there is input. Returns an empty string on EOF, or if the reading is cancelled"""
+        with self.condition:
+            waiting = not self._ready()
+        if waiting:
+            # Only when the program starts to wait, and not with the lock held, as the Tk thread takes it too
+            self.text.after_idle(self.text.focus)
+        with self.condition:
+            self.condition.wait_for(self._ready)
+            return "".join(self.queue.popleft() for _ in range(min(size, len(self.queue))))
+            
+    def poll(self):
+        """Return a character without blocking, an empty string on EOF or cancel, or None if there's no input yet"""
+        with self.condition:
+            if self.queue:
+                return self.queue.popleft()
+            if self.eof or self.cancelled:
+                return ""
+        return None
+        
     def readline(self):
-        self.enter_pressed = False
-        self.text.focus()
-        while not self.enter_pressed:
-            if interpreter.stop:
-                interpreter.running = False
-                interpreter.exit()
-        line = int(self.text.index("insert")[0]) - 1
-        return self.text.get("{}.0".format(line), "{}.end".format(line))
+        line = ""
+        while not line.endswith("\n"):
+            char = self.read(1)
+            if not char:
+                break
+            line += char
+        return line
+        
+    def cancel(self):
+        """Wake up the waiting read, so the stopped program can exit"""
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
     
     def clear(self):
+        with self.condition:
+            self.queue.clear()
+            self.eof = False
+            self.cancelled = False
         self.text.delete("0.0", "end")
 
 
+# The control characters are shown escaped, except newlines and tabs
+_escapes = {code: "\\x{:02x}".format(code) for code in list(range(32)) + list(range(127, 160)) if code not in (9, 10)}
+
+
 class Output(tk.Frame):
-    def __init__(self, *args, **kwargs):
+    """
+    The interpreter writes into a buffer from its thread, and the buffer
+    is flushed by a timer on the Tk main thread into a ring buffer of
+    lines. The Text widget only holds the lines which are visible, so a
+    huge output doesn't slow it down. Lines longer than line_limit are
+    split, and the text keeps its newlines, so it can be saved as it was
+    """
+    def __init__(self, *args, flush_interval=50, scrollback=100000, line_limit=1024, **kwargs):
         tk.Frame.__init__(self, *args, **kwargs)
         
-        self.scrollbar = ttk.Scrollbar(self)
+        self.scrollbar = ttk.Scrollbar(self, command=self.yview)
         self.scrollbar.pack(side='right', fill='y')
         
-        self.text = tk.Text(self, state="disabled", relief="flat", highlightthickness=0, insertwidth=1, yscrollcommand=self.scrollbar.set)
+        self.xscrollbar = ttk.Scrollbar(self, orient="horizontal")
+        self.xscrollbar.pack(side='bottom', fill='x')
+        
+        self.text = tk.Text(self, state="disabled", relief="flat", highlightthickness=0, insertwidth=1, wrap="none",
+                            xscrollcommand=self.xscrollbar.set)
         self.text.pack(expand=True, fill='both')
         
-        self.scrollbar.config(command=self.text.yview)
+        self.xscrollbar.config(command=self.text.xview)
+        
+        self.flush_interval = flush_interval
+        self.line_limit = line_limit
+        self.lines = collections.deque(maxlen=scrollback or None) # Lines kept, 0 means unlimited
+        self.tail = "" # The last line, which isn't finished yet
+        self.dropped = 0 # Lines which fell out of the ring buffer
+        self.top = 0 # The first visible line, counted from the start of the output
+        self.rows = 1
+        self.follow = True # Keep showing the end, while it's scrolled to the bottom
+        self.hex = False
+        self.found = None # Line of the last search result
+        self.buffer = []
+        self.lock = threading.Lock()
+        
+        def configure(event):
+            self.rows = max(event.height // tkfont.Font(font=self.text.cget("font")).metrics("linespace"), 1)
+            self.render()
+            
+        def wheel(event):
+            if event.num == 4 or event.delta > 0:
+                self.scroll(-3)
+            else:
+                self.scroll(3)
+            return "break"
+            
+        self.text.bind("<Configure>", configure)
+        self.text.bind("<MouseWheel>", wheel)
+        self.text.bind("<Button-4>", wheel)
+        self.text.bind("<Button-5>", wheel)
+        self.text.bind("<Prior>", lambda event: self.scroll(-self.rows) or "break")
+        self.text.bind("<Next>", lambda event: self.scroll(self.rows) or "break")
         
         sys.stdout = self
+        self.after(self.flush_interval, self.flush)
     
     def disabler(func):
         def wrapper(self, *args, **kwargs):
@@ -77,23 +179,149 @@ class Output(tk.Frame):
             return func
         return wrapper
     
-    @disabler
-    def delete(self, *args, **kwargs):
-        self.text.delete(*args, **kwargs)
+    def delete(self, *args):
+        """Clear the whole output (the arguments are the Text-like range, which is always everything)"""
+        with self.lock:
+            self.buffer = []
+        self.lines.clear()
+        self.tail = ""
+        self.dropped = self.top = 0
+        self.follow = True
+        self.found = None
+        self.render()
         
-    @disabler
     def write(self, content):
-        self.text.insert("end", content)
+        with self.lock:
+            self.buffer.append(content)
+            
+    def _split(self, line):
+        limit = self.line_limit
+        return [line[index:index + limit] for index in range(0, len(line), limit)] or [line]
+            
+    def _append(self, content):
+        parts = content.split("\n")
+        parts[0] = self.tail + parts[0]
+        lines = []
+        for part in parts[:-1]:
+            pieces = self._split(part)
+            pieces[-1] += "\n"
+            lines.extend(pieces)
+        pieces = self._split(parts[-1])
+        lines.extend(pieces[:-1])
+        self.tail = pieces[-1]
+        
+        if self.lines.maxlen is not None:
+            self.dropped += max(len(self.lines) + len(lines) - self.lines.maxlen, 0)
+        self.lines.extend(lines)
+            
+    def flush(self):
+        with self.lock:
+            content, self.buffer = "".join(self.buffer), []
+        if content:
+            self._append(content)
+            self.render()
+        self.after(self.flush_interval, self.flush)
+        
+    def count(self):
+        """Number of lines kept, with the unfinished one"""
+        return len(self.lines) + 1
+        
+    def line(self, index):
+        return self.lines[index] if index < len(self.lines) else self.tail
+        
+    def format(self, line):
+        if self.hex:
+            return " ".join("{:02x}".format(ord(char)) for char in line)
+        return line.rstrip("\n").translate(_escapes)
+        
+    @disabler
+    def render(self):
+        count = self.count()
+        if self.follow:
+            self.top = self.dropped + max(count - self.rows, 0)
+        first = min(max(self.top - self.dropped, 0), max(count - self.rows, 0))
+        self.top = self.dropped + first
+        last = min(first + self.rows, count)
+        
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(self.format(self.line(index)) for index in range(first, last)))
+        if self.found is not None and first <= self.found - self.dropped < last:
+            self.text.tag_add("found", "{}.0".format(self.found - self.dropped - first + 1),
+                              "{}.end".format(self.found - self.dropped - first + 1))
+        self.scrollbar.set(first / count, last / count)
+        
+    def scroll(self, lines):
+        count = self.count()
+        first = min(max(self.top - self.dropped + lines, 0), max(count - self.rows, 0))
+        self.top = self.dropped + first
+        self.follow = first + self.rows >= count
+        self.render()
+        
+    def yview(self, action, amount, unit=None):
+        """The command of the scrollbar"""
+        if action == "moveto":
+            self.scroll(int(float(amount) * self.count()) - (self.top - self.dropped))
+        else:
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+            
+    def set_hex(self, value):
+        self.hex = value
+        self.render()
+        
+    def search(self, pattern, backwards=False, nocase=True):
+        """
+        Show the next line containing pattern, after (or before) the last
+        result, and return whether there was one
+        """
+        if nocase:
+            pattern = pattern.lower()
+        lines = list(self.lines) + [self.tail]
+        if self.found is not None and self.found >= self.dropped:
+            start = self.found - self.dropped
+        else:
+            start = len(lines) if backwards else -1
+        order = range(start - 1, -1, -1) if backwards else range(start + 1, len(lines))
+        for index in order:
+            line = lines[index].lower() if nocase else lines[index]
+            if pattern in line:
+                self.found = self.dropped + index
+                self.top = self.found - self.rows // 2
+                self.follow = False
+                self.scroll(0)
+                return True
+        return False
+        
+    def save(self, path):
+        """Write the kept output into a file. The values are bytes, unless it's run with bigger cells"""
+        text = "".join(self.lines) + self.tail
+        try:
+            data = text.encode("latin-1")
+        except UnicodeEncodeError:
+            data = text.encode("utf-8")
+        with open(path, "wb") as file:
+            file.write(data)
 
 
 class Editor(tk.Frame):
+    """
+    Only the edited lines and the visible ones are highlighted right away,
+    the rest of the file is done in small chunks when Tk is idle
+    """
+    tags = ("Token.Keyword", "Token.Name.Builtin", "Token.Name.Tag", "Token.Name.Variable", "Token.Comment")
+    chunk = 500 # Lines highlighted in one idle callback
+    load_chunk = 1 << 18 # Characters loaded in one callback
+    
     def __init__(self, *args, **kwargs):
         tk.Frame.__init__(self, *args, **kwargs)
         
         self.scrollbar = ttk.Scrollbar(self)
         self.scrollbar.pack(side='right', fill='y')
         
-        self.text = tk.Text(self, relief="flat", highlightthickness=0, insertwidth=1, yscrollcommand=self.scrollbar.set)
+        self.gutter = tk.Canvas(self, width=14, highlightthickness=0)
+        self.gutter.pack(side='left', fill='y')
+        self.gutter.bind("<Button-1>", self.toggle_breakpoint)
+        
+        self.text = tk.Text(self, relief="flat", highlightthickness=0, insertwidth=1, yscrollcommand=self.scrolled)
         self.text.pack(expand=True, fill='both')
         
         self.font = tkfont.Font(family='monospace', size=10)
@@ -102,46 +330,362 @@ class Editor(tk.Frame):
         
         self.scrollbar.config(command=self.text.yview)
         
+        self.text.bind("<KeyPress>", self.key_pressed)
         self.text.bind("<KeyRelease>", self.modified)
         
         self.get = self.text.get
         self.delete = self.text.delete
+        
+        # Tk's modified flag counts the edits. The text is only hashed if it
+        # was edited since the save, but its length is the saved one again
         self.dirty = False
+        self.edits = 0
+        self.saved_edits = None
+        self.saved_length = None
+        self.saved_hash = None
+        self.check_job = None
+        self.text.bind("<<Modified>>", self.edited)
+        
+        self.progress = ttk.Progressbar(self, mode="determinate")
+        self.loading = None # The file which is being loaded
+        self.load_job = None
+        
+        self.edited_line = 1
+        self.highlighted = 0 # The lines before this are done by the background job
+        self.job = None
+        
+        # The breakpoints are marks, so they move with the text
+        self.breakpoints = set()
+        self.breakpoint_count = 0
+        self.breakpoint_color = "#d73a49"
+        
+        # The warnings of the analyzer are marks too, with their messages
+        self.warnings = {}
+        self.warning_color = "#e36209"
+        self.tooltip = tk.Label(self.text, relief="solid", bd=1, padx=4, justify="left")
+        self.text.tag_configure("warning", underline=True)
+        self.text.tag_bind("warning", "<Enter>", self.show_tooltip)
+        self.text.tag_bind("warning", "<Leave>", lambda *args: self.tooltip.place_forget())
         
     def insert(self, *args, **kwargs):
         self.text.insert(*args, **kwargs)
         self.highlight()
         
+    def key_pressed(self, *args):
+        self.edited_line = int(self.text.index("insert").split(".")[0])
+        
     def modified(self, *args):
-        self.event_generate("<<Compare>>")
-        self.highlight()
+        self.draw_gutter()
+        line = int(self.text.index("insert").split(".")[0])
+        # Pasting moves the cursor through the inserted lines
+        self.highlight_lines(min(line, self.edited_line), max(line, self.edited_line))
         
-    def highlight_line(self, line=None):
-        start_range = 0
-        index = self.text.index("insert").split(".")
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha1(content.encode("utf-8", "surrogatepass")).digest()
         
+    def edited(self, *args):
+        # <<Modified>> is only sent when the flag gets set, so it's cleared every time
+        if self.text.edit_modified():
+            self.text.edit_modified(False)
+            self.edits += 1
+            if self.check_job is None:
+                self.check_job = self.after(300, self.check_dirty)
+                
+    def check_dirty(self):
+        """Compare the text with the saved one, and send <<DirtyChanged>> if that changed. Returns whether it's dirty"""
+        if self.check_job is not None:
+            self.after_cancel(self.check_job)
+            self.check_job = None
+        if self.loading:
+            return self.dirty
+        if self.edits == self.saved_edits:
+            dirty = False
+        elif self.length() != self.saved_length:
+            dirty = True
+        else:
+            dirty = self.content_hash(self.text.get("1.0", "end")) != self.saved_hash
+        if dirty != self.dirty:
+            self.dirty = dirty
+            self.event_generate("<<DirtyChanged>>")
+        return dirty
+        
+    def length(self):
+        return self.tk.call(self.text, "count", "-chars", "1.0", "end")
+        
+    def mark_saved(self, saved_hash=None, saved_length=None):
+        """The text is what's in the file, or the file has the text of saved_hash, which is saved_length long"""
+        if saved_hash is None:
+            self.text.edit_modified(False) # The edits before this don't count
+            self.saved_hash = self.content_hash(self.text.get("1.0", "end"))
+            self.saved_length = self.length()
+            self.saved_edits = self.edits
+        else:
+            self.saved_hash = saved_hash
+            self.saved_length = saved_length
+            self.saved_edits = None # It may not be the text
+        self.check_dirty()
+        
+    def mark_unsaved(self):
+        """The save failed, so the text is dirty again at the next check"""
+        self.saved_hash = self.saved_length = self.saved_edits = None
+        
+    def load(self, path, done=None):
+        """
+        Load a file in chunks, so a huge one doesn't freeze the window.
+        The text can't be edited meanwhile, and done is called at the end
+        """
+        self.cancel_load()
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.loading = open(path)
+        self.progress.config(maximum=max(os.path.getsize(path), 1), value=0)
+        self.progress.pack(side="bottom", fill="x", before=self.scrollbar)
+        self.text.config(state="disabled")
+        self.load_job = self.after(1, self._load_chunk, "", done)
+        
+    def _load_chunk(self, newlines, done):
+        data = self.loading.read(self.load_chunk)
+        if not data:
+            # The newlines at the end of the file are left out
+            self.cancel_load()
+            self.highlight()
+            if done:
+                done()
+            return
+        data = newlines + data
+        content = data.rstrip("\n")
+        self.text.config(state="normal")
+        self.text.insert("end-1c", content)
+        self.text.config(state="disabled")
+        self.progress.step(len(data) - len(newlines))
+        self.load_job = self.after(1, self._load_chunk, data[len(content):], done)
+        
+    def cancel_load(self):
+        if self.load_job is not None:
+            self.after_cancel(self.load_job)
+            self.load_job = None
+        if self.loading:
+            self.loading.close()
+            self.loading = None
+            self.progress.pack_forget()
+            self.text.config(state="normal")
+        
+    def scrolled(self, first, last):
+        self.scrollbar.set(first, last)
+        self.highlight_visible()
+        self.draw_gutter()
+        
+    def toggle_breakpoint(self, event):
+        line = self.text.index("@0,{}".format(event.y)).split(".")[0]
+        for mark in self.breakpoints:
+            if self.text.index(mark).split(".")[0] == line:
+                self.breakpoints.remove(mark)
+                self.text.mark_unset(mark)
+                break
+        else:
+            self.breakpoint_count += 1
+            mark = "breakpoint{}".format(self.breakpoint_count)
+            self.text.mark_set(mark, "{}.0".format(line))
+            self.text.mark_gravity(mark, "left")
+            self.breakpoints.add(mark)
+        self.draw_gutter()
+        
+    def breakpoint_positions(self):
+        """The breakpoints as offsets in the code"""
+        return [len(self.text.get("1.0", mark)) for mark in self.breakpoints]
+        
+    def draw_gutter(self):
+        self.gutter.delete("all")
+        for mark in self.warnings:
+            info = self.text.dlineinfo(mark)
+            if info:
+                x, y, width, height, baseline = info
+                middle = y + height // 2
+                self.gutter.create_polygon(7, middle - 5, 12, middle + 4, 2, middle + 4, fill=self.warning_color, outline="")
+        for mark in self.breakpoints:
+            info = self.text.dlineinfo(mark)
+            if info:
+                x, y, width, height, baseline = info
+                middle = y + height // 2
+                self.gutter.create_oval(3, middle - 4, 11, middle + 4, fill=self.breakpoint_color, outline="")
+                
+    def show_warnings(self, warnings):
+        """Underline the code of the (position, message) warnings of the analyzer, and mark their lines"""
+        self.clear_warnings()
+        for number, (position, message) in enumerate(warnings):
+            index = "1.0 + {} chars".format(position)
+            mark = "warning{}".format(number)
+            self.text.mark_set(mark, index)
+            self.text.mark_gravity(mark, "left")
+            self.warnings[mark] = message
+            self.text.tag_add("warning", index, index + " + 1 chars")
+        self.draw_gutter()
+        
+    def clear_warnings(self):
+        self.text.tag_remove("warning", "1.0", "end")
+        for mark in self.warnings:
+            self.text.mark_unset(mark)
+        self.warnings = {}
+        self.tooltip.place_forget()
+        self.draw_gutter()
+        
+    def show_tooltip(self, event):
+        index = self.text.index("@{},{}".format(event.x, event.y))
+        messages = [message for mark, message in self.warnings.items() if self.text.compare(mark, "==", index)]
+        if messages:
+            self.tooltip.config(text="\n".join(messages))
+            self.tooltip.place(x=event.x + 10, y=event.y + 10)
+                
+    def show_position(self, start=None, end=None):
+        """Mark the code the debugger is going to execute"""
+        self.text.tag_remove("debug", "1.0", "end")
+        if start is not None:
+            self.text.tag_add("debug", "1.0 + {} chars".format(start), "1.0 + {} chars".format(end))
+            self.text.see("1.0 + {} chars".format(start))
+        
+    def visible_lines(self):
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index("@0,{}".format(self.text.winfo_height())).split(".")[0])
+        return first, last
+        
+    def highlight_visible(self):
+        first, last = self.visible_lines()
+        if last >= self.highlighted:
+            self.highlight_lines(max(first, self.highlighted), last)
+            
+    def highlight_line(self, line=None):
         if line == None:
-            line = int(index[0])
+            line = int(self.text.index("insert").split(".")[0])
+        self.highlight_lines(line, line)
+        
+    def highlight_lines(self, first, last):
+        start = "{}.0".format(first)
+        end = "{}.end".format(last)
+        for tag in self.tags:
+            self.text.tag_remove(tag, start, end)
+            
+        line = first
+        for line_text in self.text.get(start, end).split("\n"):
+            for token in tokenize(line_text):
+                self.text.tag_add(_token_tags[token.lastgroup], "{}.{}".format(line, token.start()), "{}.{}".format(line, token.end()))
+            line += 1
+        
+    def show_heatmap(self, heat):
+        """Color the background of the code by the (start, end, level) ranges of a profile"""
+        self.clear_heatmap()
+        for start, end, level in heat:
+            self.text.tag_add("heat{}".format(level), "1.0 + {} chars".format(start), "1.0 + {} chars".format(end))
+            
+    def clear_heatmap(self):
+        for tag in self.text.tag_names():
+            if tag.startswith("heat"):
+                self.text.tag_remove(tag, "1.0", "end")
         
-        line_text = self.text.get("{}.{}".format(line, 0), "{}.end".format(line))
+    def highlight(self, *args):
+        if self.job:
+            self.text.after_cancel(self.job)
+        self.highlighted = 0
+        self.highlight_visible()
+        self.job = self.text.after_idle(self.highlight_chunk, 1)
+        
+    def highlight_chunk(self, first):
+        lines = int(self.text.index("end-1c").split(".")[0])
+        last = min(first + self.chunk - 1, lines)
+        self.highlight_lines(first, last)
+        self.highlighted = last + 1
+        if last < lines:
+            self.job = self.text.after(1, self.highlight_chunk, last + 1)
+        else:
+            self.job = None
+            
+            
+_token_tags = {
+    "brace": "Token.Keyword",
+    "value": "Token.Name.Builtin",
+    "io": "Token.Name.Tag",
+    "variable": "Token.Name.Variable",
+    "comment": "Token.Comment",
+}
 
-        for token, content in lex(line_text, BrainfuckLexer()):
-            end_range = start_range + len(content)
-            self.text.tag_add(str(token), '{}.{}'.format(line,start_range), '{}.{}'.format(line,end_range))
-            start_range = end_range
+_tokens = re.compile(r"(?P<brace>[\[\]]+)|(?P<value>[+-]+)|(?P<io>[.,]+)|(?P<variable>[<>]+)|(?P<comment>[^\[\]+\-.,<>]+)")
 
 
-    def highlight(self, *args):
-        if pygments:
-            code = self.text.get("1.0", "end-1c")
-            i = 1
-            for line in code.splitlines():
-                self.text.index("%d.0" %i)
-                self.highlight_line(line=i)
-                self.text.update()
-                i += 1
+def tokenize(code):
+    """The same token types as pygments' BrainfuckLexer gives, but much faster"""
+    return _tokens.finditer(code)
             
             
+class TapeView(tk.Frame):
+    """
+    Shows the cells of a tape around the pointer. Only the visible cells
+    are drawn, so even a huge tape can be scrolled through
+    """
+    cell_width = 48
+    
+    def __init__(self, *args, **kwargs):
+        tk.Frame.__init__(self, *args, **kwargs)
+        
+        self.canvas = tk.Canvas(self, height=52, highlightthickness=0)
+        self.canvas.pack(expand=True, fill='both')
+        
+        self.scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.xview)
+        self.scrollbar.pack(fill='x')
+        
+        self.canvas.bind("<Configure>", self.redraw)
+        
+        self.tape = None
+        self.pointer = 0
+        self.first = 0 # The first visible cell, relative to the origin of the tape
+        self.fg = "#0d1117"
+        self.highlight = "#fff5b1"
+        
+    def visible_count(self):
+        return max(self.canvas.winfo_width() // self.cell_width, 1) + 1
+    
+    def show(self, tape, pointer):
+        """Show the tape, and scroll to the pointer (an index of the buffer) if it's not visible"""
+        self.tape = tape
+        self.pointer = pointer
+        cell = pointer - tape.origin
+        visible = self.visible_count() - 1
+        if not self.first <= cell < self.first + visible:
+            self.first = cell - visible // 2
+        self.redraw()
+        
+    def xview(self, *args):
+        if self.tape is None:
+            return
+        visible = self.visible_count() - 1
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.tape)) - self.tape.origin
+        elif args[2] == "pages":
+            self.first += int(args[1]) * visible
+        else:
+            self.first += int(args[1])
+        self.redraw()
+        
+    def redraw(self, *args):
+        self.canvas.delete("all")
+        if self.tape is None:
+            return
+        cells, origin = self.tape.cells, self.tape.origin
+        self.first = min(max(self.first, -origin), max(len(cells) - origin - self.visible_count() + 1, -origin))
+        
+        for column in range(self.visible_count()):
+            index = origin + self.first + column
+            if index >= len(cells):
+                break
+            x = column * self.cell_width
+            fill = self.highlight if index == self.pointer else ""
+            self.canvas.create_rectangle(x + 1, 2, x + self.cell_width - 1, 32, outline=self.fg, fill=fill)
+            self.canvas.create_text(x + self.cell_width // 2, 17, text=str(cells[index]), fill=self.fg)
+            self.canvas.create_text(x + self.cell_width // 2, 43, text=str(index - origin), fill=self.fg, font=("TkDefaultFont", 7))
+            
+        start = (origin + self.first) / len(cells)
+        self.scrollbar.set(start, start + self.visible_count() / len(cells))
+
+
 class LinkLabel(ttk.Label):
     
     def __init__(self, *args, **kwargs):
@@ -168,6 +712,8 @@ class LinkLabel(ttk.Label):
         self.configure(foreground=self.normalcolor)
 
     def _open(self, *args):
+        import webbrowser
+        
         self.leave()
         webbrowser.open(self.url)
         